@@ -0,0 +1,109 @@
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from bench.generator import Scale, api_rows
+
+logger = logging.getLogger(__name__)
+
+
+class FakeMyTargetAPI:
+    def __init__(self, scale: Scale, latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0) -> None:
+        self.scale = scale
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.campaigns = [{'id': campaign_id, 'name': f'Campaign {campaign_id}'}
+                          for campaign_id in sorted({campaign_id for campaign_id, _, _ in scale.hierarchy()})]
+        self.banners = [{'id': banner_id, 'campaign_id': campaign_id, 'ad_group_id': ad_group_id}
+                        for campaign_id, ad_group_id, banner_id in scale.hierarchy()]
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeMyTargetAPI':
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-api', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'FakeMyTargetAPI':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @staticmethod
+    def page(items: List[Dict], params: Dict[str, str]) -> Dict:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 20))
+        return {'count': len(items), 'offset': offset, 'items': items[offset:offset + limit]}
+
+    def respond(self, path: str, params: Dict[str, str]) -> Optional[Dict]:
+        if path.endswith('/campaigns.json'):
+            return self.page(self.campaigns, params)
+        if path.endswith('/banners.json'):
+            banners = self.banners
+            if '_campaign_id' in params:
+                banners = [banner for banner in banners if banner['campaign_id'] == int(params['_campaign_id'])]
+            return self.page(banners, params)
+        if path.endswith('/statistics/banners/day.json'):
+            banner_ids = [int(banner_id) for banner_id in params['id'].split(',')]
+            return {'items': [{'id': banner_id, 'rows': api_rows(self.scale, banner_id), 'total': {}}
+                              for banner_id in banner_ids]}
+        return None
+
+    def handler(self) -> type:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def send_json(self, status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with api.lock:
+                    api.requests[url.path] = api.requests.get(url.path, 0) + 1
+
+                if api.latency:
+                    time.sleep(api.latency)
+                if random.random() < api.rate_limit_rate:
+                    self.send_json(429, {'error': 'rate limited'}, {'Retry-After': '0'})
+                    return
+                if random.random() < api.error_rate:
+                    self.send_json(503, {'error': 'unavailable'})
+                    return
+
+                body = api.respond(url.path, params)
+                if body is None:
+                    self.send_json(404, {'error': 'not found'})
+                else:
+                    self.send_json(200, body)
+
+        return Handler
@@ -0,0 +1,115 @@
+import os
+from datetime import date, timedelta
+from os.path import join
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, Integer, NVARCHAR
+
+from src.models import Performance
+from src.staging import get_format
+
+KEY_COLUMNS = ('performance_id', 'campaign_id', 'ad_group_id', 'banner_id', 'date', 'fingerprint')
+METRIC_GROUPS = ('base', 'events', 'uniques', 'video', 'carousel', 'ad_offers', 'playable', 'tps', 'moat',
+                 'social_network', 'romi')
+SPARSE_GROUPS = ('carousel', 'ad_offers', 'playable', 'moat', 'social_network', 'romi')
+FRACTIONAL_SUFFIXES = ('_rate', '_percent')
+
+
+def metric_columns() -> List[str]:
+    return [column for column in Performance.__table__.columns.keys() if column not in KEY_COLUMNS]
+
+
+def split_metric(column: str) -> Tuple[str, str]:
+    group = max((group for group in METRIC_GROUPS if column.startswith(f'{group}_')), key=len)
+    return group, column[len(group) + 1:]
+
+
+class Scale:
+    def __init__(self, campaigns: int = 10, banners: int = 20, days: int = 3, ad_groups: int = 2,
+                 start: date = date(2024, 1, 1), seed: int = 42) -> None:
+        self.campaigns = campaigns
+        self.banners = banners
+        self.days = days
+        self.ad_groups = ad_groups
+        self.start = start
+        self.seed = seed
+
+    @property
+    def rows(self) -> int:
+        return self.campaigns * self.banners * self.days
+
+    def hierarchy(self) -> Iterator[Tuple[int, int, int]]:
+        for campaign in range(self.campaigns):
+            campaign_id = 1000 + campaign
+            for banner in range(self.banners):
+                ad_group_id = campaign_id * 100 + banner % self.ad_groups
+                banner_id = campaign_id * 10000 + banner
+                yield campaign_id, ad_group_id, banner_id
+
+    def dates(self) -> List[date]:
+        return [self.start + timedelta(days=day) for day in range(self.days)]
+
+    def __repr__(self) -> str:
+        return f'{self.campaigns}x{self.banners}x{self.days}'
+
+
+def metric_frame(rows: int, rng: np.random.Generator) -> pd.DataFrame:
+    data = {}
+    for column in metric_columns():
+        column_type = Performance.__table__.columns[column].type
+        group, _ = split_metric(column)
+        if isinstance(column_type, NVARCHAR):
+            values = pd.Series(['10-25'] * rows, dtype=object)
+            values[rng.random(rows) < 0.5] = 0.5
+        elif isinstance(column_type, Integer) and column.endswith(FRACTIONAL_SUFFIXES):
+            values = pd.Series(rng.integers(0, 1000, rows) / 10, dtype='float64')
+        elif isinstance(column_type, Integer):
+            values = pd.Series(rng.integers(0, 10000, rows), dtype='float64')
+        elif isinstance(column_type, Float):
+            values = pd.Series(rng.random(rows) * 1000, dtype='float64')
+        else:
+            continue
+        if group in SPARSE_GROUPS:
+            values[rng.random(rows) < 0.95] = None
+        data[column] = values
+    return pd.DataFrame(data)
+
+
+def statistics_frame(scale: Scale, campaign_id: int, ad_group_id: int, banner_id: int,
+                     rng: np.random.Generator) -> pd.DataFrame:
+    dates = scale.dates()
+    df = metric_frame(len(dates), rng)
+    df.insert(0, 'date', [day.isoformat() for day in dates])
+    df.insert(0, 'banner_id', banner_id)
+    df.insert(0, 'ad_group_id', ad_group_id)
+    df.insert(0, 'campaign_name', f'Campaign {campaign_id}')
+    df.insert(0, 'campaign_id', campaign_id)
+    return df
+
+
+def generate_statistics(folder: str, scale: Scale, staging_format: str = 'parquet') -> List[str]:
+    os.makedirs(folder, exist_ok=True)
+    writer = get_format(staging_format)
+    rng = np.random.default_rng(scale.seed)
+
+    files = []
+    for campaign_id, ad_group_id, banner_id in scale.hierarchy():
+        path = join(folder, f'{campaign_id}_{ad_group_id}_{banner_id}{writer.extension}')
+        writer.write(statistics_frame(scale, campaign_id, ad_group_id, banner_id, rng), path)
+        files.append(path)
+    return files
+
+
+def api_rows(scale: Scale, banner_id: int) -> List[Dict]:
+    rng = np.random.default_rng(scale.seed + banner_id)
+    df = metric_frame(scale.days, rng)
+    rows = []
+    for day, (_, metrics) in zip(scale.dates(), df.iterrows()):
+        row: Dict = {'date': day.isoformat()}
+        for column, value in metrics.items():
+            group, name = split_metric(column)
+            row.setdefault(group, {})[name] = None if pd.isna(value) else value
+        rows.append(row)
+    return rows
@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from os.path import abspath, dirname, join
+from typing import Callable, Dict, List, Optional
+
+project_root = dirname(dirname(abspath(__file__)))
+sys.path.append(project_root)
+os.environ.setdefault('PROD', '0')
+
+from bench.fake_api import FakeMyTargetAPI
+from bench.generator import Scale, generate_statistics
+
+logger = logging.getLogger(__name__)
+
+BASELINE_FILE = join(project_root, 'bench', 'baseline.json')
+BENCHMARKS = ('download', 'dataset', 'populate', 'startup')
+TOLERANCE = 0.2
+STARTUP_RUNS = 5
+
+
+def measure(name: str, rows: int, prepare: Callable[[str], Callable[[], None]], workdir: str) -> Dict:
+    func = prepare(join(workdir, f'{name}-timed'))
+    started = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - started
+
+    func = prepare(join(workdir, f'{name}-traced'))
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'benchmark': name,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2)
+    }
+    logger.info(f'{name}: {result}')
+    return result
+
+
+def bench_download(scale: Scale, workdir: str, args: argparse.Namespace) -> Dict:
+    from src.report import DateRange, download_statistics
+
+    with FakeMyTargetAPI(scale, latency=args.latency, error_rate=args.error_rate,
+                         rate_limit_rate=args.rate_limit_rate) as api:
+        def prepare(folder: str) -> Callable[[], None]:
+            os.makedirs(folder, exist_ok=True)
+            statistics_file = join(folder, '{campaign_id}_{ad_group_id}_{banner_id}.parquet')
+            return lambda: download_statistics('benchmark', statistics_file, DateRange.LAST_3_DAYS,
+                                               concurrency=args.concurrency)
+
+        os.environ['MYTARGET_BASE_URL'] = api.base_url
+        try:
+            return measure('download', scale.rows, prepare, workdir)
+        finally:
+            os.environ.pop('MYTARGET_BASE_URL')
+
+
+def bench_dataset(scale: Scale, workdir: str, args: argparse.Namespace) -> Dict:
+    from src.db import DIMENSION_TABLES, Dataset
+    from src.models import Performance
+
+    def prepare(folder: str) -> Callable[[], None]:
+        files = generate_statistics(folder, scale, args.format)
+
+        def run() -> None:
+            for file in files:
+                dataset = Dataset(file)
+                for table in (*DIMENSION_TABLES, Performance.__table__):
+                    dataset.records(table)
+
+        return run
+
+    return measure('dataset', scale.rows, prepare, workdir)
+
+
+def bench_populate(scale: Scale, workdir: str, args: argparse.Namespace) -> Dict:
+    from src.db import load_folder
+
+    def prepare(folder: str) -> Callable[[], None]:
+        generate_statistics(folder, scale, args.format)
+        connection_url = f'sqlite:///{folder}.db'
+        return lambda: load_folder(folder, connection_url, '')
+
+    return measure('populate', scale.rows, prepare, workdir)
+
+
+def bench_startup(scale: Scale, workdir: str, args: argparse.Namespace) -> Dict:
+    from src.cli import STARTUP_BUDGET
+
+    timings = []
+    for _ in range(STARTUP_RUNS):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'src.cli', 'status'], cwd=project_root, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+
+    seconds = statistics.median(timings)
+    result = {
+        'benchmark': 'startup',
+        'rows': 0,
+        'seconds': round(seconds, 4),
+        'rows_per_second': 0.0,
+        'peak_memory_mb': 0.0,
+        'budget_seconds': STARTUP_BUDGET,
+        'within_budget': seconds <= STARTUP_BUDGET
+    }
+    logger.info(f'startup: {result}')
+    return result
+
+
+def compare(results: List[Dict], baseline: Dict[str, Dict], tolerance: float) -> bool:
+    passed = True
+    for result in results:
+        if 'within_budget' in result:
+            if not result['within_budget']:
+                passed = False
+                logger.warning(f'{result["benchmark"]}: {result["seconds"]}s is over the '
+                               f'{result["budget_seconds"]}s budget')
+            continue
+
+        reference = baseline.get(result['benchmark'])
+        if reference is None:
+            logger.info(f'{result["benchmark"]}: no baseline')
+            continue
+
+        ratio = result['rows_per_second'] / reference['rows_per_second'] if reference['rows_per_second'] else 0
+        memory_ratio = result['peak_memory_mb'] / reference['peak_memory_mb'] if reference['peak_memory_mb'] else 0
+        result['baseline_ratio'] = round(ratio, 3)
+        result['baseline_memory_ratio'] = round(memory_ratio, 3)
+        if ratio < 1 - tolerance or memory_ratio > 1 + tolerance:
+            passed = False
+            logger.warning(f'{result["benchmark"]}: regression, {ratio:.2f}x throughput and '
+                           f'{memory_ratio:.2f}x peak memory of baseline')
+        else:
+            logger.info(f'{result["benchmark"]}: {ratio:.2f}x throughput and {memory_ratio:.2f}x peak memory '
+                        f'of baseline')
+    return passed
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the download, Dataset and load stages')
+    parser.add_argument('benchmarks', nargs='*', help=f'one or more of: {", ".join(BENCHMARKS)}, default: all')
+    parser.add_argument('--campaigns', type=int, default=10)
+    parser.add_argument('--banners', type=int, default=20, help='banners per campaign')
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--format', default='parquet', help='staging format for generated files')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='fake API latency per request, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of fake API 503 responses')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of fake API 429 responses')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', help='write results as JSON to this file')
+
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}, expected one of: {", ".join(BENCHMARKS)}')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s : %(message)s')
+    for name in ('src', 'urllib3'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    args = parse_args(argv)
+    scale = Scale(campaigns=args.campaigns, banners=args.banners, days=args.days)
+    logger.info(f'Scale {scale}: {scale.rows} rows')
+
+    runners = {'download': bench_download, 'dataset': bench_dataset, 'populate': bench_populate,
+               'startup': bench_startup}
+    with tempfile.TemporaryDirectory(prefix='mytarget-bench-') as workdir:
+        results = [runners[name](scale, workdir, args) for name in args.benchmarks or BENCHMARKS]
+
+    for result in results:
+        result['scale'] = repr(scale)
+
+    passed = all(result.get('within_budget', True) for result in results)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump({result['benchmark']: result for result in results}, baseline_file, indent=2)
+        logger.info(f'Baseline saved to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            passed = compare(results, json.load(baseline_file), args.tolerance) and passed
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output)
+    print(output)
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
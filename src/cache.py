@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import Table, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models import AdGroup, Banner, Campaign
+from src.upsert import primary_key, to_records
+
+logger = logging.getLogger(__name__)
+
+CACHED_TABLES = (Campaign.__table__, AdGroup.__table__, Banner.__table__)
+CACHE_SIZE = 100000
+SNAPSHOT_TTL = 7 * 24 * 60 * 60
+
+
+def attributes_hash(record: Dict, columns: List[str]) -> str:
+    values = repr(tuple(record.get(column) for column in columns))
+    return hashlib.blake2b(values.encode(), digest_size=8).hexdigest()
+
+
+class DimensionCache:
+    def __init__(self, maxsize: int = CACHE_SIZE, snapshot_path: Optional[str] = None,
+                 snapshot_ttl: float = SNAPSHOT_TTL) -> None:
+        self.maxsize = maxsize
+        self.snapshot_path = snapshot_path
+        self.snapshot_ttl = snapshot_ttl
+        self.source: Optional[str] = None
+        self.entries: Dict[str, OrderedDict] = {table.name: OrderedDict() for table in CACHED_TABLES}
+        self.hits: Dict[str, int] = {table.name: 0 for table in CACHED_TABLES}
+        self.misses: Dict[str, int] = {table.name: 0 for table in CACHED_TABLES}
+
+    def signature(self) -> Dict:
+        return {
+            'source': self.source,
+            'tables': {table.name: list(table.columns.keys()) for table in CACHED_TABLES}
+        }
+
+    @staticmethod
+    def attribute_columns(table: Table) -> List[str]:
+        pk = primary_key(table).name
+        return [column for column in table.columns.keys() if column != pk]
+
+    def _put(self, table_name: str, key, value: str) -> None:
+        entries = self.entries[table_name]
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def warm(self, engine: Engine) -> None:
+        self.source = engine.url.render_as_string(hide_password=True)
+        try:
+            self.preload(engine)
+        except SQLAlchemyError as exc:
+            logger.warning(f'Could not preload the dimension cache from database: {exc}')
+            for entries in self.entries.values():
+                entries.clear()
+            if not self.load_snapshot():
+                logger.info('Starting with an empty dimension cache')
+            return
+
+        logger.info(f'Dimension cache preloaded from database: {self.sizes()}')
+        self.save_snapshot()
+
+    def preload(self, engine: Engine) -> None:
+        with engine.connect() as connection:
+            inspector = inspect(connection)
+            for table in CACHED_TABLES:
+                if not inspector.has_table(table.name, schema=table.schema):
+                    logger.info(f'{table.name} does not exist yet, starting with an empty cache for it')
+                    continue
+                columns = self.attribute_columns(table)
+                pk = primary_key(table)
+                for row in connection.execute(select(table)).mappings():
+                    self._put(table.name, row[pk.name], attributes_hash(row, columns))
+
+    def load_snapshot(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        if time.time() - os.path.getmtime(self.snapshot_path) > self.snapshot_ttl:
+            logger.info(f'Dimension cache snapshot {self.snapshot_path} expired')
+            return False
+
+        with open(self.snapshot_path, 'r', encoding='utf-8') as snapshot_file:
+            snapshot = json.load(snapshot_file)
+        if snapshot.get('signature') != self.signature():
+            logger.info(f'Dimension cache snapshot {self.snapshot_path} was taken from another database or schema')
+            return False
+
+        for table_name, entries in snapshot['entries'].items():
+            for key, value in entries:
+                self._put(table_name, key, value)
+        logger.info(f'Dimension cache loaded from snapshot: {self.sizes()}')
+        return True
+
+    def save_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        snapshot = {
+            'signature': self.signature(),
+            'entries': {table_name: list(entries.items()) for table_name, entries in self.entries.items()}
+        }
+        tmp_path = f'{self.snapshot_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def changed(self, table: Table, df: pd.DataFrame) -> pd.DataFrame:
+        if table.name not in self.entries or df.empty:
+            return df
+
+        entries = self.entries[table.name]
+        columns = self.attribute_columns(table)
+        pk = primary_key(table).name
+
+        keep = []
+        for record in to_records(df):
+            cached = entries.get(record[pk])
+            if cached is not None and cached == attributes_hash(record, columns):
+                entries.move_to_end(record[pk])
+                keep.append(False)
+            else:
+                keep.append(True)
+
+        kept = sum(keep)
+        self.hits[table.name] += len(keep) - kept
+        self.misses[table.name] += kept
+        return df[keep]
+
+    def update(self, table: Table, df: pd.DataFrame) -> None:
+        if table.name not in self.entries:
+            return
+
+        columns = self.attribute_columns(table)
+        pk = primary_key(table).name
+        for record in to_records(df):
+            self._put(table.name, record[pk], attributes_hash(record, columns))
+
+    def invalidate(self, table: Optional[Table] = None, keys: Optional[Iterable] = None) -> None:
+        tables = [table.name] if table is not None else list(self.entries)
+        for table_name in tables:
+            if keys is None:
+                self.entries[table_name].clear()
+            else:
+                for key in keys:
+                    self.entries[table_name].pop(key, None)
+
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+
+    def sizes(self) -> Dict[str, int]:
+        return {table_name: len(entries) for table_name, entries in self.entries.items()}
+
+    def log_stats(self) -> None:
+        for table_name in self.entries:
+            logger.info(f'Dimension cache {table_name}: {self.hits[table_name]} hits, '
+                        f'{self.misses[table_name]} misses, {len(self.entries[table_name])} entries')
@@ -0,0 +1,277 @@
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import logging
+import os
+import sys
+import traceback
+from datetime import date
+from os.path import dirname, exists, join
+from typing import Callable, List, Optional
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+STARTUP_BUDGET = 0.5
+
+
+def parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+def run_pipeline(config: Config, command: str, body: Callable[[], List[str]]) -> int:
+    from src.logger import flush_logger, setup_logger, stop_logger
+    from src.notification import send_document, send_message, shutdown
+    from src.profiling import PROFILE, profiled
+
+    logger_file = setup_logger(today=config.today, project_root=config.project_root, log_format=config.log_format,
+                               level=config.log_level, rotation=config.log_rotation)
+    run_name = join(dirname(logger_file), config.today.strftime('%d.%m.%y'))
+    if command != 'sync':
+        run_name = f'{run_name}.{command}'
+
+    try:
+        with profiled(run_name, config.profiler):
+            try:
+                send_message('### MYTARGET ###')
+                send_message(f'Starting {command} for {config.today_date}')
+                logger.info(f'Starting {command} for {config.today_date}')
+                send_message('\n'.join(body()))
+            except Exception as exc:
+                logger.exception(exc)
+                flush_logger()
+                send_document(logger_file, caption=traceback.format_exc())
+                raise
+
+            flush_logger()
+            send_document(logger_file)
+            send_message(f'Successfully finished {command} for {config.today_date}')
+            logger.info(f'Successfully finished {command} for {config.today_date}')
+    finally:
+        shutdown()
+        PROFILE.log()
+        PROFILE.write(f'{run_name}.summary.json')
+        stop_logger()
+    return 0
+
+
+def config_engine(config: Config):
+    from src.db import get_engine
+
+    return get_engine(config.connection_url, config.database)
+
+
+def sync_windows_for(config: Config, engine):
+    if not config.incremental:
+        return None
+
+    from src.sync import SETTLEMENT_LAG_DAYS, sync_windows
+
+    return sync_windows(engine, config.today_date, config.settlement_lag or SETTLEMENT_LAG_DAYS)
+
+
+def statistics_template(config: Config, folder: str) -> str:
+    from src.staging import get_format
+
+    os.makedirs(folder, exist_ok=True)
+    return join(folder, '{campaign_id}_{ad_group_id}_{banner_id}' + get_format(config.staging_format).extension)
+
+
+def run_scheduler(config: Config, folder: str, date_range, watermarks: bool = True, partitions=None,
+                  on_partition_complete=None) -> List[str]:
+    from src.cache import DimensionCache
+    from src.manifest import RunManifest
+    from src.scheduler import Scheduler
+
+    engine = config_engine(config)
+    cache = DimensionCache(snapshot_path=config.dimension_snapshot)
+    cache.warm(engine)
+
+    date_ranges = sync_windows_for(config, engine) if watermarks else None
+    scheduler = Scheduler(list(config.access_tokens), statistics_template(config, folder), date_range, engine,
+                          workers=max(config.concurrency, 1), account_concurrency=config.account_concurrency,
+                          rate_limit=config.rate_limit, date_ranges=date_ranges,
+                          cache_dir=config.http_cache_dir,
+                          manifest=None if partitions else RunManifest(config.manifest_path(folder)),
+                          cache=cache, incremental=config.incremental, processes=config.load_processes,
+                          partitions=partitions, on_partition_complete=on_partition_complete,
+                          layout=config.storage_layout)
+    summaries = scheduler.run()
+    cache.log_stats()
+    cache.save_snapshot()
+
+    failed = [summary.account for summary in summaries.values() if summary.errors]
+    if failed:
+        from src.notification import send_message
+
+        send_message('\n'.join(str(summary) for summary in summaries.values()))
+        raise RuntimeError(f'Failed jobs in {", ".join(failed)}, rerun to retry them')
+    return [str(summary) for summary in summaries.values()]
+
+
+def command_sync(config: Config, args: argparse.Namespace) -> int:
+    from src.report import DateRange
+
+    folder = config.statistics_folder(args.date)
+    return run_pipeline(config, 'sync', lambda: run_scheduler(config, folder, DateRange.LAST_3_DAYS))
+
+
+def command_download(config: Config, args: argparse.Namespace) -> int:
+    def body() -> List[str]:
+        from src.manifest import RunManifest
+        from src.report import DateRange, download_accounts
+
+        folder = config.statistics_folder(args.date)
+        date_ranges = sync_windows_for(config, config_engine(config)) if config.incremental else None
+        hierarchy = download_accounts(list(config.access_tokens), statistics_template(config, folder),
+                                      DateRange.LAST_3_DAYS, config.concurrency, config.rate_limit,
+                                      date_ranges=date_ranges, cache_dir=config.http_cache_dir,
+                                      manifest=RunManifest(config.manifest_path(folder)))
+        return [f'{len(hierarchy)} banners downloaded to {folder}']
+
+    return run_pipeline(config, 'download', body)
+
+
+def command_load(config: Config, args: argparse.Namespace) -> int:
+    def body() -> List[str]:
+        from src.cache import DimensionCache
+        from src.db import load_folder
+        from src.manifest import RunManifest
+
+        folder = args.folder or config.statistics_folder(args.date)
+        cache = DimensionCache(snapshot_path=config.dimension_snapshot)
+        cache.warm(config_engine(config))
+        log_messages = load_folder(folder, config.connection_url, config.database, incremental=config.incremental,
+                                   workers=config.load_workers, cache=cache, processes=config.load_processes,
+                                   manifest=RunManifest(config.manifest_path(folder)),
+                                   chunk_size=args.chunk_size or config.load_chunk_size,
+                                   layout=config.storage_layout)
+        cache.log_stats()
+        cache.save_snapshot()
+        return log_messages
+
+    return run_pipeline(config, 'load', body)
+
+
+def command_backfill(config: Config, args: argparse.Namespace) -> int:
+    def body() -> List[str]:
+        from src.manifest import RunManifest
+        from src.report import DateWindow
+        from src.scheduler import Partition
+
+        window = DateWindow(args.start, args.end)
+        folder = join(config.project_root, 'statistics', 'backfill', f'{args.start}_{args.end}')
+        progress = RunManifest(config.manifest_path(folder))
+
+        shards = window.shards(args.days)
+        partitions = []
+        for shard in shards:
+            name = f'{shard.start}_{shard.end}'
+            if progress.completed(name):
+                continue
+            shard_folder = join(folder, name)
+            partitions.append(Partition(name, shard, statistics_template(config, shard_folder),
+                                        RunManifest(config.manifest_path(shard_folder))))
+
+        skipped = len(shards) - len(partitions)
+        logger.info(f'Backfill {window.start}..{window.end}: {len(shards)} shards of {args.days} days, '
+                    f'{skipped} already completed')
+        if not partitions:
+            return [f'Backfill {window.start}..{window.end}: all {len(shards)} shards already completed']
+
+        def record(partition: Partition) -> None:
+            progress.record_shard(partition.name, str(partition.window.start), str(partition.window.end))
+
+        messages = run_scheduler(config, folder, window, watermarks=False, partitions=partitions,
+                                 on_partition_complete=record)
+        return [f'Backfill {window.start}..{window.end}: {len(progress.shards)}/{len(shards)} shards completed, '
+                f'{skipped} skipped', *messages]
+
+    return run_pipeline(config, 'backfill', body)
+
+
+def command_rebuild_rollups(config: Config, args: argparse.Namespace) -> int:
+    def body() -> List[str]:
+        from src.rollup import rebuild_rollups
+
+        rebuilt = rebuild_rollups(config_engine(config), args.start, args.end, layout=config.storage_layout)
+        return [f'{table}: {rows} rows rebuilt' for table, rows in rebuilt.items()]
+
+    return run_pipeline(config, 'rebuild-rollups', body)
+
+
+def command_status(config: Config, args: argparse.Namespace) -> int:
+    folder = config.statistics_folder(args.date)
+    manifest_path = config.manifest_path(folder)
+    status = {'date': str(args.date or config.today_date), 'folder': folder, 'manifest': None}
+
+    if exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        downloads, loads = manifest.get('downloads', {}), manifest.get('loads', {})
+        status['manifest'] = {
+            'downloaded_banners': len(downloads),
+            'downloaded_rows': sum(entry['rows'] for entry in downloads.values()),
+            'loaded_files': len(loads),
+            'loaded_rows': sum(entry['rows'] for entry in loads.values()),
+        }
+    if os.path.isdir(folder):
+        status['files'] = len([file for file in os.listdir(folder) if not file.endswith('.tmp')])
+
+    startup = time.perf_counter() - STARTED
+    status['startup_seconds'] = round(startup, 4)
+    status['startup_budget_seconds'] = STARTUP_BUDGET
+    print(json.dumps(status, indent=2))
+    if startup > STARTUP_BUDGET:
+        print(f'Startup took {startup:.3f}s, over the {STARTUP_BUDGET}s budget', file=sys.stderr)
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='mytarget', description='myTarget statistics pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sync = commands.add_parser('sync', help='download statistics and load them as files arrive')
+    sync.add_argument('--date', type=parse_date, help='statistics folder date, default: today')
+    sync.set_defaults(func=command_sync)
+
+    download = commands.add_parser('download', help='download statistics only')
+    download.add_argument('--date', type=parse_date, help='statistics folder date, default: today')
+    download.set_defaults(func=command_download)
+
+    load = commands.add_parser('load', help='load downloaded statistics into the database')
+    load.add_argument('--date', type=parse_date, help='statistics folder date, default: today')
+    load.add_argument('--folder', help='load this folder instead of the dated statistics folder')
+    load.add_argument('--chunk-size', type=int,
+                      help='stream each file in chunks of this many rows to bound memory, default: LOAD_CHUNK_SIZE')
+    load.set_defaults(func=command_load)
+
+    backfill = commands.add_parser('backfill', help='download and load an arbitrary date range')
+    backfill.add_argument('start', type=parse_date)
+    backfill.add_argument('end', type=parse_date)
+    backfill.add_argument('--days', type=int, default=7, help='shard size in days, default: 7')
+    backfill.set_defaults(func=command_backfill)
+
+    rebuild = commands.add_parser('rebuild-rollups', help='rebuild the daily rollup tables from Performance')
+    rebuild.add_argument('start', type=parse_date, nargs='?')
+    rebuild.add_argument('end', type=parse_date, nargs='?')
+    rebuild.set_defaults(func=command_rebuild_rollups)
+
+    status = commands.add_parser('status', help='show progress of a run without touching the database')
+    status.add_argument('--date', type=parse_date, help='statistics folder date, default: today')
+    status.set_defaults(func=command_status)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    return args.func(Config.from_env(), args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
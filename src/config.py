@@ -0,0 +1,118 @@
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from os.path import abspath, dirname, join
+from typing import Optional, Tuple
+
+from src.logger import LOG_FORMATS, LOG_LEVELS, LOG_ROTATIONS
+
+PROJECT_ROOT = dirname(dirname(abspath(__file__)))
+TIMEZONE = 'Asia/Almaty'
+STORAGE_LAYOUTS = ('wide', 'narrow')
+MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December')
+
+
+def optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def choice(name: str, choices: Tuple[str, ...], default: Optional[str] = None) -> Optional[str]:
+    value = os.getenv(name) or default
+    if value is None:
+        return None
+    matches = [option for option in choices if option.lower() == value.lower()]
+    if not matches:
+        raise ValueError(f'Unknown {name} {value}, expected one of: {", ".join(choices)}')
+    return matches[0]
+
+
+@dataclass(frozen=True)
+class Config:
+    project_root: str
+    today: datetime
+    prod: bool
+    connection_url: str
+    database: Optional[str]
+    access_tokens: Tuple[str, ...]
+    concurrency: int
+    account_concurrency: int
+    rate_limit: Optional[float]
+    incremental: bool
+    settlement_lag: Optional[int]
+    staging_format: str
+    load_workers: int
+    load_processes: int
+    load_chunk_size: Optional[int]
+    storage_layout: str
+    profiler: Optional[str]
+    log_format: str
+    log_level: int
+    log_rotation: Optional[str]
+
+    @classmethod
+    def from_env(cls, project_root: str = PROJECT_ROOT) -> 'Config':
+        import dotenv
+        import pytz
+
+        dotenv.load_dotenv()
+        prod = os.getenv('PROD', '0') == '1'
+        if prod:
+            connection_url = (
+                'mssql+pyodbc://{user}:{password}@{host}:{port}/{database}?driver={driver}'
+                .format(
+                    user=os.getenv('USER'),
+                    password=os.getenv('PASSWORD'),
+                    host=os.getenv('HOST'),
+                    port=os.getenv('PORT'),
+                    database='{database}',
+                    driver=os.getenv('DRIVER')
+                )
+            )
+        else:
+            connection_url = f'sqlite:///{join(project_root, "mytarget.db")}'
+
+        concurrency = int(os.getenv('CONCURRENCY', '1'))
+        return cls(
+            project_root=project_root,
+            today=datetime.now(pytz.timezone(TIMEZONE)),
+            prod=prod,
+            connection_url=connection_url,
+            database=os.getenv('DATABASE'),
+            access_tokens=tuple(token for token in os.getenv('ACCESS_TOKENS', '').split(',') if token),
+            concurrency=concurrency,
+            account_concurrency=optional_int('ACCOUNT_CONCURRENCY') or concurrency,
+            rate_limit=float(os.getenv('RATE_LIMIT', '0')) or None,
+            incremental=os.getenv('SYNC_MODE', 'full') == 'incremental',
+            settlement_lag=optional_int('SETTLEMENT_LAG'),
+            staging_format=os.getenv('STAGING_FORMAT', 'parquet'),
+            load_workers=int(os.getenv('LOAD_WORKERS', '4')),
+            load_processes=int(os.getenv('LOAD_PROCESSES', '1')),
+            load_chunk_size=optional_int('LOAD_CHUNK_SIZE'),
+            storage_layout=choice('STORAGE_LAYOUT', STORAGE_LAYOUTS, 'wide'),
+            profiler=os.getenv('PROFILER') or None,
+            log_format=choice('LOG_FORMAT', LOG_FORMATS, 'text'),
+            log_level=logging.getLevelName(choice('LOG_LEVEL', LOG_LEVELS, 'DEBUG')),
+            log_rotation=choice('LOG_ROTATION', LOG_ROTATIONS)
+        )
+
+    @property
+    def today_date(self) -> date:
+        return self.today.date()
+
+    def statistics_folder(self, day: Optional[date] = None) -> str:
+        day = day or self.today_date
+        return join(self.project_root, 'statistics', str(day.year), MONTHS[day.month - 1], f'{day}')
+
+    def manifest_path(self, folder: str) -> str:
+        return f'{folder}.manifest.json'
+
+    @property
+    def http_cache_dir(self) -> str:
+        return join(self.project_root, 'cache', 'http')
+
+    @property
+    def dimension_snapshot(self) -> str:
+        return join(self.project_root, 'cache', 'dimensions.json')
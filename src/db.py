@@ -1,21 +1,66 @@
+import hashlib
 import logging
-from os.path import basename
-from typing import Generator
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from os.path import basename, join
+from typing import Dict, Generator, Iterator, List, Optional, Set, Tuple, Union
 
 import pandas as pd
-from sqlalchemy import Table, create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import BigInteger, Date, Float, Integer, String, Table, create_engine
+from sqlalchemy.engine import Engine
 
-from src.models import AdGroup, Banner, Base, Campaign, Performance
+from src.cache import DimensionCache
+from src.hierarchy import AccountHierarchy
+from src.manifest import CHECKPOINT_ROWS, RunManifest
+from src.models import AdGroup, Banner, Campaign, Performance
+from src.profiling import PROFILE, stage
+from src.query import invalidate_results, mark_loaded
+from src.rollup import refresh_rollups
 from src.notification import send_message
+from src.parallel import load_performance_parallel, supports_parallel
+from src.staging import CHUNK_SIZE, iter_statistics, read_statistics
+from src.storage import create_tables
+from src.sync import sync_performance, write_changed
+from src.upsert import BATCH_SIZE, UpsertResult, to_records, upsert
 
 logger = logging.getLogger(__name__)
 
+DIMENSION_TABLES = (Campaign.__table__, AdGroup.__table__, Banner.__table__)
+
+
+def performance_ids(df: pd.DataFrame) -> pd.Series:
+    dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%dT%H:%M:%S')
+    keys = (df['campaign_id'].astype(str) + '_' + df['ad_group_id'].astype(str) + '_'
+            + df['banner_id'].astype(str) + '_' + dates)
+    return pd.Series([hashlib.md5(key.encode()).hexdigest() for key in keys], index=df.index, dtype=object)
+
+
+def coerce_frame(df: pd.DataFrame, table: Table) -> pd.DataFrame:
+    for column in table.columns:
+        if column.name not in df.columns:
+            continue
+
+        if isinstance(column.type, Date):
+            df[column.name] = pd.to_datetime(df[column.name]).dt.date
+        elif isinstance(column.type, (BigInteger, Integer)):
+            values = pd.to_numeric(df[column.name], errors='coerce')
+            if (values.dropna() % 1 == 0).all():
+                values = values.astype('Int64')
+            df[column.name] = values
+        elif isinstance(column.type, Float):
+            df[column.name] = pd.to_numeric(df[column.name], errors='coerce').astype('float64')
+        elif isinstance(column.type, String):
+            values = df[column.name].astype(object)
+            df[column.name] = values.where(values.isna(), values.astype(str))
+    return df
+
 
 class Dataset:
-    def __init__(self, statistics_file: str):
-        self.statistics_df = pd.read_json(statistics_file, orient='records')
+    def __init__(self, statistics: Union[str, pd.DataFrame], hierarchy: Optional[AccountHierarchy] = None):
+        self.statistics_df = read_statistics(statistics) if isinstance(statistics, str) else statistics
         self.size = len(self.statistics_df)
+        self.hierarchy = hierarchy
 
     def is_empty(self) -> bool:
         return self.size == 0
@@ -41,44 +86,286 @@ class Dataset:
         for _, performance in self.statistics_df[performance_columns].drop_duplicates().iterrows():
             yield Performance(**performance.to_dict())
 
+    def dimension_frame(self, table: Table) -> Optional[pd.DataFrame]:
+        rows = {
+            Campaign.__table__: self.hierarchy.campaign_rows,
+            AdGroup.__table__: self.hierarchy.ad_group_rows,
+            Banner.__table__: self.hierarchy.banner_rows,
+        }.get(table)
+        if rows is None:
+            return None
+
+        banner_ids = self.statistics_df['banner_id'].unique().tolist()
+        if any(banner_id not in self.hierarchy.banners for banner_id in banner_ids):
+            return None
+        return pd.DataFrame(rows(banner_ids), columns=self.columns(table))
+
+    def frame(self, table: Table) -> pd.DataFrame:
+        with stage(f'dataset.frame.{table.name}') as timer:
+            df = self._frame(table)
+            timer.rows = len(df)
+        return df
+
+    def _frame(self, table: Table) -> pd.DataFrame:
+        if self.hierarchy is not None:
+            df = self.dimension_frame(table)
+            if df is not None:
+                return df
+
+        columns = [col for col in self.columns(table) if col in self.statistics_df.columns]
+        df = self.statistics_df[columns].drop_duplicates().copy()
+        if table is Performance.__table__:
+            df['performance_id'] = performance_ids(df)
+
+        pk = [col.name for col in table.primary_key.columns]
+        return coerce_frame(df.drop_duplicates(subset=pk, keep='last'), table)
+
+    def records(self, table: Table) -> list[dict]:
+        df = self.frame(table)
+        with stage(f'dataset.records.{table.name}', rows=len(df)):
+            return to_records(df)
 
-def populate_db(statistics_file: str, connection_url: str, database: str) -> str:
-    logger.info(f'Starting DB population...')
 
+class StreamingDataset:
+    def __init__(self, statistics_file: str, hierarchy: Optional[AccountHierarchy] = None,
+                 chunk_size: int = CHUNK_SIZE):
+        self.statistics_file = statistics_file
+        self.hierarchy = hierarchy
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.seen: Dict[Table, Set] = {table: set() for table in DIMENSION_TABLES}
+
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    def chunks(self) -> Iterator[Dataset]:
+        for df in iter_statistics(self.statistics_file, self.chunk_size):
+            self.size += len(df)
+            yield Dataset(df, self.hierarchy)
+
+    def new_dimensions(self, dataset: Dataset, table: Table) -> pd.DataFrame:
+        df = dataset.frame(table)
+        pk = table.primary_key.columns.values()[0].name
+        seen = self.seen[table]
+        df = df[~df[pk].isin(seen)]
+        seen.update(df[pk].tolist())
+        return df
+
+
+@dataclass
+class LoadResult:
+    results: Dict[str, UpsertResult] = field(default_factory=dict)
+    skipped: int = 0
+    rollups: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, result: UpsertResult) -> None:
+        if result.table in self.results:
+            result = self.results[result.table] + result
+        self.results[result.table] = result
+
+    def __add__(self, other: 'LoadResult') -> 'LoadResult':
+        combined = LoadResult(skipped=self.skipped + other.skipped)
+        for result in [*self.results.values(), *other.results.values()]:
+            combined.add(result)
+        for table, rows in [*self.rollups.items(), *other.rollups.items()]:
+            combined.rollups[table] = combined.rollups.get(table, 0) + rows
+        return combined
+
+    def __str__(self) -> str:
+        summary = ', '.join(str(result) for result in self.results.values())
+        if Performance.__tablename__ in self.results:
+            summary += f', {self.skipped} unchanged skipped'
+        if self.rollups:
+            summary += ', rollups ' + ', '.join(f'{table} {rows}' for table, rows in self.rollups.items())
+        return summary
+
+
+def create_db_engine(connection_url: str, **kwargs) -> Engine:
     if 'sqlite' in connection_url:
-        engine = create_engine(connection_url, echo=False)
+        engine = create_engine(connection_url, echo=False, **kwargs)
     else:
+        engine = create_engine(connection_url, use_setinputsizes=False, fast_executemany=True, echo=False, **kwargs)
+    return PROFILE.instrument(engine)
+
+
+def get_engine(connection_url: str, database: str) -> Engine:
+    if 'sqlite' not in connection_url:
         connection_url = connection_url.format(database=database)
-        engine = create_engine(connection_url, use_setinputsizes=False, echo=False)
+    return create_db_engine(connection_url)
+
+
+def load_dataset(engine: Engine, dataset: Dataset, batch_size: int = BATCH_SIZE, incremental: bool = False,
+                 stream: Optional[StreamingDataset] = None, cache: Optional[DimensionCache] = None,
+                 processes: int = 1, layout: str = 'wide') -> LoadResult:
+    load_result = LoadResult()
+    for table in DIMENSION_TABLES:
+        df = dataset.frame(table) if stream is None else stream.new_dimensions(dataset, table)
+        if cache is not None:
+            df = cache.changed(table, df)
+        with stage(f'db.upsert.{table.name}', rows=len(df)), engine.begin() as connection:
+            load_result.add(upsert(connection, table, to_records(df), batch_size=batch_size))
+        if cache is not None:
+            cache.update(table, df)
+
+    if processes > 1 and not supports_parallel(engine):
+        logger.info(f'{engine.dialect.name} does not support parallel loading, loading Performance serially')
+        processes = 1
+
+    performance = dataset.frame(Performance.__table__)
+    if processes > 1:
+        with stage(f'db.upsert.{Performance.__tablename__}.parallel', rows=dataset.size):
+            skipped, changed, result = load_performance_parallel(engine, performance, processes, batch_size,
+                                                                 incremental, layout=layout)
+        load_result.skipped += skipped
+        load_result.add(result)
+        PROFILE.count('db.performance.unchanged_skipped', skipped)
+        with stage('db.rollups', rows=len(changed)), engine.begin() as connection:
+            load_result.rollups = refresh_rollups(connection, changed)
+            mark_loaded(connection)
+        return load_result
+
+    with stage(f'db.upsert.{Performance.__tablename__}', rows=dataset.size), engine.begin() as connection:
+        write = sync_performance if incremental else write_changed
+        changed, result = write(connection, performance, batch_size, layout)
+        load_result.skipped += len(performance) - len(changed)
+        load_result.add(result)
+        PROFILE.count('db.performance.unchanged_skipped', len(performance) - len(changed))
+
+        with stage('db.rollups', rows=len(changed)):
+            load_result.rollups = refresh_rollups(connection, changed)
+        mark_loaded(connection)
+
+    return load_result
+
+
+def load_stream(engine: Engine, stream: StreamingDataset, batch_size: int = BATCH_SIZE,
+                incremental: bool = False, cache: Optional[DimensionCache] = None,
+                layout: str = 'wide') -> LoadResult:
+    load_result = LoadResult()
+    for dataset in stream.chunks():
+        load_result += load_dataset(engine, dataset, batch_size, incremental, stream=stream, cache=cache,
+                                    layout=layout)
+        logger.info(f'{stream.statistics_file}: loaded {stream.size} rows so far.')
+    return load_result
+
+
+def populate_db(statistics_file: str, connection_url: str, database: str, batch_size: int = BATCH_SIZE,
+                hierarchy: Optional[AccountHierarchy] = None, incremental: bool = False,
+                chunk_size: Optional[int] = None, cache: Optional[DimensionCache] = None, processes: int = 1,
+                manifest: Optional[RunManifest] = None, layout: str = 'wide') -> str:
+    logger.info(f'Starting DB population...')
 
     file_name_no_ext = basename(statistics_file).split('.')[0]
+    if manifest is not None and manifest.loaded(statistics_file):
+        logger.info(f'{file_name_no_ext}: already loaded.')
+        return f'{file_name_no_ext}: already loaded.'
+
+    engine = get_engine(connection_url, database)
+
+    create_tables(engine, layout)
+
+    if chunk_size is not None:
+        stream = StreamingDataset(statistics_file, hierarchy, chunk_size)
+        summary = load_stream(engine, stream, batch_size, incremental, cache, layout)
+        dataset_size = stream.size
+    else:
+        dataset = Dataset(statistics_file, hierarchy)
+        dataset_size = dataset.size
+        summary = None if dataset.is_empty() else load_dataset(engine, dataset, batch_size, incremental,
+                                                               cache=cache, processes=processes, layout=layout)
+
+    if manifest is not None:
+        manifest.record_loads([statistics_file], [dataset_size])
+    invalidate_results()
+
+    if dataset_size == 0:
+        logger.info(f'{file_name_no_ext}: statistics are empty.')
+        return f'{file_name_no_ext}: statistics are empty.'
+
+    logger.info(f'{file_name_no_ext}: DB populated {dataset_size} rows. {summary}')
+    return f'{file_name_no_ext}: DB populated {dataset_size} rows. {summary}'
+
+
+def checkpoint_groups(files: List[str], frames: List[pd.DataFrame],
+                      checkpoint_rows: int) -> Iterator[Tuple[List[str], List[pd.DataFrame]]]:
+    group_files, group_frames, rows = [], [], 0
+    for file, df in zip(files, frames):
+        group_files.append(file)
+        group_frames.append(df)
+        rows += len(df)
+        if rows >= checkpoint_rows:
+            yield group_files, group_frames
+            group_files, group_frames, rows = [], [], 0
+    if group_files:
+        yield group_files, group_frames
+
+
+def load_folder(folder: str, connection_url: str, database: str, batch_size: int = BATCH_SIZE,
+                hierarchy: Optional[AccountHierarchy] = None, incremental: bool = False,
+                workers: int = 4, cache: Optional[DimensionCache] = None, processes: int = 1,
+                manifest: Optional[RunManifest] = None, checkpoint_rows: int = CHECKPOINT_ROWS,
+                chunk_size: Optional[int] = None, layout: str = 'wide') -> List[str]:
+    logger.info(f'Starting DB population for {folder}...')
+
+    engine = get_engine(connection_url, database)
+    create_tables(engine, layout)
+
+    log_messages = []
+    files = sorted(join(folder, file) for file in os.listdir(folder) if not file.endswith('.tmp'))
+    if manifest is not None:
+        pending = [file for file in files if not manifest.loaded(file)]
+        for file in sorted(set(files) - set(pending)):
+            log_messages.append(f'{basename(file).split(".")[0]}: already loaded.')
+        files = pending
 
-    Base.metadata.create_all(engine)
+    if chunk_size is not None:
+        summary, rows = LoadResult(), 0
+        for file in files:
+            stream = StreamingDataset(file, hierarchy, chunk_size)
+            summary += load_stream(engine, stream, batch_size, incremental, cache, layout)
+            rows += stream.size
+            if manifest is not None:
+                manifest.record_loads([file], [stream.size])
 
-    dataset = Dataset(statistics_file)
-    dataset_size = dataset.size
+            file_name_no_ext = basename(file).split('.')[0]
+            if stream.is_empty():
+                log_messages.append(f'{file_name_no_ext}: statistics are empty.')
+            else:
+                log_messages.append(f'{file_name_no_ext}: DB populated {stream.size} rows.')
+        invalidate_results()
+        log_messages.append(f'{len(files)} files, {rows} rows. {summary}')
 
-    if dataset.is_empty():
-        logger.info(f'{file_name_no_ext}: JSON statistics are empty.')
-        return f'{file_name_no_ext}: JSON statistics are empty.'
+        logger.info('\n'.join(log_messages))
+        return log_messages
 
-    with sessionmaker(engine, autocommit=False, autoflush=False)() as session:
-        for campaign in dataset.campaigns():
-            session.merge(campaign)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse') as executor:
+        frames = list(executor.map(read_statistics, files))
 
-        for ad_group in dataset.ad_groups():
-            session.merge(ad_group)
+    for file, df in zip(files, frames):
+        file_name_no_ext = basename(file).split('.')[0]
+        if df.empty:
+            log_messages.append(f'{file_name_no_ext}: statistics are empty.')
+        else:
+            log_messages.append(f'{file_name_no_ext}: DB populated {len(df)} rows.')
 
-        for ad in dataset.banners():
-            session.merge(ad)
+    if manifest is not None:
+        empty_files = [file for file, df in zip(files, frames) if df.empty]
+        manifest.record_loads(empty_files, [0] * len(empty_files))
 
-        for idx, performance in enumerate(dataset.performance(), start=1):
-            if idx % 10000 == 0 or idx == dataset_size:
-                logger.info(f'Processed {idx}/{dataset_size} rows.')
-                session.commit()
-            session.merge(performance)
+    files, frames = [file for file, df in zip(files, frames) if not df.empty], [df for df in frames if not df.empty]
+    if not frames:
+        logger.info(f'{folder}: all statistics are empty or already loaded.')
+        return log_messages
 
-        session.commit()
+    summary = LoadResult()
+    for group_files, group_frames in checkpoint_groups(files, frames, checkpoint_rows):
+        dataset = Dataset(pd.concat(group_frames, ignore_index=True), hierarchy)
+        summary += load_dataset(engine, dataset, batch_size, incremental, cache=cache, processes=processes,
+                                layout=layout)
+        if manifest is not None:
+            manifest.record_loads(group_files, [len(df) for df in group_frames])
+    invalidate_results()
+    log_messages.append(f'{len(files)} files, {sum(len(df) for df in frames)} rows. {summary}')
 
-    logger.info(f'{file_name_no_ext}: DB populated {dataset_size} rows.')
-    return f'{file_name_no_ext}: DB populated {dataset_size} rows.'
+    logger.info('\n'.join(log_messages))
+    return log_messages
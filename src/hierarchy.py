@@ -0,0 +1,82 @@
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+    from src.report import MyTargetAPI
+
+logger = logging.getLogger(__name__)
+
+
+class AccountHierarchy:
+    def __init__(self) -> None:
+        self.campaigns: Dict[int, str] = {}
+        self.ad_groups: Dict[int, int] = {}
+        self.banners: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.banners)
+
+    def add_campaign(self, campaign_id: int, campaign_name: str) -> None:
+        self.campaigns[campaign_id] = campaign_name
+
+    def add_banner(self, campaign_id: int, ad_group_id: int, banner_id: int) -> None:
+        self.ad_groups[ad_group_id] = campaign_id
+        self.banners[banner_id] = ad_group_id
+
+    def update(self, other: 'AccountHierarchy') -> None:
+        self.campaigns.update(other.campaigns)
+        self.ad_groups.update(other.ad_groups)
+        self.banners.update(other.banners)
+
+    @classmethod
+    def fetch(cls, api: 'MyTargetAPI', session: 'requests.Session') -> 'AccountHierarchy':
+        hierarchy = cls()
+        for campaign in api.get_campaigns(session):
+            hierarchy.add_campaign(campaign['campaign_id'], campaign['campaign_name'])
+
+        skipped = 0
+        for banner in api.get_banners(session):
+            if banner['campaign_id'] not in hierarchy.campaigns:
+                skipped += 1
+                continue
+            hierarchy.add_banner(banner['campaign_id'], banner['ad_group_id'], banner['banner_id'])
+
+        logger.info(f'Fetched {len(hierarchy.campaigns)} campaigns, {len(hierarchy.ad_groups)} ad groups, '
+                    f'{len(hierarchy.banners)} banners ({skipped} banners of unlisted campaigns skipped)')
+        return hierarchy
+
+    def item(self, banner_id: int) -> Dict:
+        ad_group_id = self.banners[banner_id]
+        campaign_id = self.ad_groups[ad_group_id]
+        return {
+            'campaign_id': campaign_id,
+            'campaign_name': self.campaigns[campaign_id],
+            'ad_group_id': ad_group_id,
+            'banner_id': banner_id
+        }
+
+    def items(self) -> Iterator[Dict]:
+        for banner_id in self.banners:
+            yield self.item(banner_id)
+
+    def campaign_rows(self, banner_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        campaign_ids = {self.ad_groups[ad_group_id] for ad_group_id in self._ad_group_ids(banner_ids)}
+        return [{'campaign_id': campaign_id, 'campaign_name': self.campaigns[campaign_id]}
+                for campaign_id in campaign_ids]
+
+    def ad_group_rows(self, banner_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        return [{'ad_group_id': ad_group_id, 'campaign_id': self.ad_groups[ad_group_id]}
+                for ad_group_id in self._ad_group_ids(banner_ids)]
+
+    def banner_rows(self, banner_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        banner_ids = self.banners if banner_ids is None else [i for i in banner_ids if i in self.banners]
+        return [{'banner_id': banner_id, 'ad_group_id': self.banners[banner_id],
+                 'campaign_id': self.ad_groups[self.banners[banner_id]]}
+                for banner_id in banner_ids]
+
+    def _ad_group_ids(self, banner_ids: Optional[Iterable[int]]) -> set:
+        if banner_ids is None:
+            return set(self.ad_groups)
+        return {self.banners[banner_id] for banner_id in banner_ids if banner_id in self.banners}
@@ -1,36 +1,186 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from multiprocessing.context import BaseContext
 from os.path import join
+from typing import Callable, Dict, Iterator, Optional, Tuple
 
+LOG_FORMATS = ('text', 'json')
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+LOG_ROTATIONS = ('size', 'time')
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+LOGGER_LEVELS: Dict[str, int] = {
+    'sqlalchemy': logging.WARNING,
+    'urllib3': logging.WARNING,
+    'requests': logging.WARNING,
+    'httpcore': logging.INFO,
+    'httpx': logging.WARNING,
+    'pyarrow': logging.WARNING,
+}
+RECORD_FIELDS = ('stage', 'duration', 'rows')
 
-def setup_logger(today: datetime, project_root: str) -> str:
-    logging.Formatter.converter = lambda *args: today.timetuple()
+LOG_QUEUE: queue.Queue = queue.Queue()
+LISTENER: Optional[QueueListener] = None
 
-    log_folder = join(project_root, 'logs')
-    os.makedirs(log_folder, exist_ok=True)
 
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+class RecordQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class ProcessQueueHandler(RecordQueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class ForwardHandler(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+class MonotonicFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'monotonic'):
+            record.monotonic = time.monotonic()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'monotonic': round(getattr(record, 'monotonic', 0.0), 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        for name in RECORD_FIELDS:
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def file_handler(logger_file: str, rotation: Optional[str]) -> logging.Handler:
+    if rotation is None:
+        return logging.FileHandler(logger_file, encoding='utf-8')
+    if rotation not in LOG_ROTATIONS:
+        raise ValueError(f'Unknown log rotation {rotation}, expected one of: {", ".join(LOG_ROTATIONS)}')
+    if rotation == 'size':
+        return RotatingFileHandler(logger_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                   encoding='utf-8')
+    return TimedRotatingFileHandler(logger_file, when='midnight', backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+
+
+def set_levels(level: int) -> None:
+    logging.getLogger().setLevel(level)
+    for name, logger_level in LOGGER_LEVELS.items():
+        logging.getLogger(name).setLevel(max(logger_level, level))
+
+
+def setup_logger(today: datetime, project_root: str, log_format: str = 'text', level: int = logging.DEBUG,
+                 rotation: Optional[str] = None) -> str:
+    global LISTENER
 
-    log_format = '%(asctime).19s %(levelname)s %(name)s %(filename)s %(funcName)s : %(message)s'
-    formatter = logging.Formatter(log_format)
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'Unknown log format {log_format}, expected one of: {", ".join(LOG_FORMATS)}')
 
+    log_folder = join(project_root, 'logs')
     today_str = today.strftime('%d.%m.%y')
     year_month_folder = join(log_folder, today.strftime('%Y/%B'))
     os.makedirs(year_month_folder, exist_ok=True)
 
-    logger_file = join(year_month_folder, f'{today_str}.log')
-    file_handler = logging.FileHandler(
-        logger_file,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
+    extension = 'jsonl' if log_format == 'json' else 'log'
+    logger_file = join(year_month_folder, f'{today_str}.{extension}')
+
+    handler = file_handler(logger_file, rotation)
+    handler.setLevel(level)
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(filename)s %(funcName)s : '
+                                               '%(message)s'))
 
-    httpcore_logger = logging.getLogger('httpcore')
-    httpcore_logger.setLevel(logging.INFO)
+    stop_logger()
+    queue_handler = RecordQueueHandler(LOG_QUEUE)
+    queue_handler.addFilter(MonotonicFilter())
+
+    logger = logging.getLogger()
+    for existing in [existing for existing in logger.handlers if isinstance(existing, QueueHandler)]:
+        logger.removeHandler(existing)
+    logger.addHandler(queue_handler)
+    set_levels(level)
 
-    logger.addHandler(file_handler)
+    LISTENER = QueueListener(LOG_QUEUE, handler, respect_handler_level=True)
+    LISTENER.start()
+    atexit.register(stop_logger)
 
     return logger_file
+
+
+def flush_logger() -> None:
+    if LISTENER is None:
+        return
+    LOG_QUEUE.join()
+    for handler in LISTENER.handlers:
+        handler.flush()
+
+
+def stop_logger() -> None:
+    global LISTENER
+
+    if LISTENER is None:
+        return
+    logger = logging.getLogger()
+    for handler in [handler for handler in logger.handlers if isinstance(handler, RecordQueueHandler)]:
+        logger.removeHandler(handler)
+    LISTENER.stop()
+    for handler in LISTENER.handlers:
+        handler.close()
+    LISTENER = None
+
+
+def setup_worker_logger(log_queue: queue.Queue, level: int) -> None:
+    queue_handler = ProcessQueueHandler(log_queue)
+    queue_handler.addFilter(MonotonicFilter())
+
+    logger = logging.getLogger()
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(queue_handler)
+    set_levels(level)
+
+
+@contextmanager
+def worker_logging(context: BaseContext) -> Iterator[Tuple[Callable[..., None], Tuple]]:
+    log_queue = context.Queue()
+    listener = QueueListener(log_queue, ForwardHandler())
+    listener.start()
+    try:
+        yield setup_worker_logger, (log_queue, logging.getLogger().getEffectiveLevel())
+    finally:
+        listener.stop()
+        log_queue.close()
+        log_queue.join_thread()
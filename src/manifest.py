@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from os.path import basename
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_ROWS = 100000
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.downloads: Dict[str, Dict] = {}
+        self.loads: Dict[str, Dict] = {}
+        self.shards: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+        self.downloads = manifest.get('downloads', {})
+        self.loads = manifest.get('loads', {})
+        self.shards = manifest.get('shards', {})
+        logger.info(f'Resuming from manifest {self.path}: {len(self.downloads)} banners downloaded, '
+                    f'{len(self.loads)} files loaded, {len(self.shards)} shards completed')
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+                json.dump({'downloads': self.downloads, 'loads': self.loads, 'shards': self.shards}, manifest_file,
+                          indent=2)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def matches(entry: Optional[Dict], path: str) -> bool:
+        return entry is not None and os.path.exists(path) and entry['checksum'] == file_checksum(path)
+
+    def downloaded(self, banner_id: int, path: str) -> bool:
+        return self.matches(self.downloads.get(str(banner_id)), path)
+
+    def record_download(self, banner_id: int, path: str, rows: int) -> None:
+        with self.lock:
+            self.downloads[str(banner_id)] = {
+                'file': basename(path), 'rows': rows, 'checksum': file_checksum(path), 'at': time.time()
+            }
+
+    def loaded(self, path: str) -> bool:
+        return self.matches(self.loads.get(basename(path)), path)
+
+    def record_loads(self, paths: List[str], rows: List[int]) -> None:
+        with self.lock:
+            for path, file_rows in zip(paths, rows):
+                self.loads[basename(path)] = {'rows': file_rows, 'checksum': file_checksum(path), 'at': time.time()}
+        self.save()
+
+    def completed(self, shard: str) -> bool:
+        return shard in self.shards
+
+    def record_shard(self, shard: str, start: str, end: str) -> None:
+        with self.lock:
+            self.shards[shard] = {'start': start, 'end': end, 'at': time.time()}
+        self.save()
@@ -1,17 +1,25 @@
 import hashlib
 import logging
 import os
+from datetime import date
 
-from sqlalchemy import BigInteger, Column, Date, Float, ForeignKey, Integer, MetaData, NVARCHAR
+from sqlalchemy import BigInteger, Column, Date, Float, ForeignKey, Index, Integer, MetaData, NVARCHAR
 from sqlalchemy.orm import declarative_base, relationship
 
 
-schema = 'dbo' if bool(int(os.getenv('PROD'), 0)) else None
+schema = 'dbo' if os.getenv('PROD', '0') == '1' else None
 logger = logging.getLogger(__name__)
+INCLUDED_METRICS = ['base_shows', 'base_clicks', 'base_spent']
 metadata = MetaData(schema=schema)
 Base = declarative_base(metadata=metadata)
 
 
+def generate_performance_id(campaign_id: int, ad_group_id: int, banner_id: int, date: date) -> str:
+    combined_string = f'{campaign_id}_{ad_group_id}_{banner_id}_{date.isoformat()}'
+    hash_object = hashlib.md5(combined_string.encode())
+    return hash_object.hexdigest()
+
+
 class Campaign(Base):
     __tablename__ = 'Campaigns'
     campaign_id = Column(BigInteger, primary_key=True, index=True)
@@ -65,11 +73,16 @@ class Banner(Base):
 
 class Performance(Base):
     __tablename__ = 'Performance'
+    __table_args__ = (
+        Index('ix_Performance_banner_id_date', 'banner_id', 'date', mssql_include=INCLUDED_METRICS),
+        Index('ix_Performance_campaign_id_date', 'campaign_id', 'date', mssql_include=INCLUDED_METRICS),
+    )
     performance_id = Column(NVARCHAR(32), primary_key=True, index=True)
     campaign_id = Column(BigInteger, ForeignKey('Campaigns.campaign_id'), index=True)
     ad_group_id = Column(BigInteger, ForeignKey('AdGroups.ad_group_id'), index=True)
     banner_id = Column(BigInteger, ForeignKey('Banners.banner_id'), index=True)
     date = Column(Date, index=True)
+    fingerprint = Column(BigInteger)
     base_shows = Column(Integer)
     base_clicks = Column(Integer)
     base_goals = Column(Float)
@@ -196,9 +209,7 @@ class Performance(Base):
         super().__init__(**kwargs)
 
     def generate_performance_id(self) -> str:
-        combined_string = f'{self.campaign_id}_{self.ad_group_id}_{self.banner_id}_{self.date.isoformat()}'
-        hash_object = hashlib.md5(combined_string.encode())
-        return hash_object.hexdigest()
+        return generate_performance_id(self.campaign_id, self.ad_group_id, self.banner_id, self.date)
 
     def __eq__(self, other):
         return self.performance_id == other.performance_id
@@ -208,3 +219,56 @@ class Performance(Base):
 
     def __repr__(self):
         return f'<Performance {self.performance_id}>'
+
+
+class LoadMarker(Base):
+    __tablename__ = 'LoadMarkers'
+    table_name = Column(NVARCHAR(100), primary_key=True)
+    version = Column(BigInteger)
+
+    def __repr__(self):
+        return f'<LoadMarker {self.table_name} {self.version}>'
+
+
+class SyncState(Base):
+    __tablename__ = 'SyncState'
+    banner_id = Column(BigInteger, primary_key=True)
+    last_synced_date = Column(Date)
+
+    def __repr__(self):
+        return f'<SyncState {self.banner_id} {self.last_synced_date}>'
+
+
+class CampaignDaily(Base):
+    __tablename__ = 'CampaignDaily'
+    campaign_id = Column(BigInteger, primary_key=True)
+    date = Column(Date, primary_key=True, index=True)
+    shows = Column(BigInteger)
+    clicks = Column(BigInteger)
+    spent = Column(Float)
+    video_started = Column(BigInteger)
+    video_viewed_100_percent = Column(BigInteger)
+    ctr = Column(Float)
+    cpc = Column(Float)
+    cpm = Column(Float)
+
+    def __repr__(self):
+        return f'<CampaignDaily {self.campaign_id} {self.date}>'
+
+
+class AdGroupDaily(Base):
+    __tablename__ = 'AdGroupDaily'
+    ad_group_id = Column(BigInteger, primary_key=True)
+    date = Column(Date, primary_key=True, index=True)
+    campaign_id = Column(BigInteger, index=True)
+    shows = Column(BigInteger)
+    clicks = Column(BigInteger)
+    spent = Column(Float)
+    video_started = Column(BigInteger)
+    video_viewed_100_percent = Column(BigInteger)
+    ctr = Column(Float)
+    cpc = Column(Float)
+    cpm = Column(Float)
+
+    def __repr__(self):
+        return f'<AdGroupDaily {self.ad_group_id} {self.date}>'
@@ -1,37 +1,51 @@
+import atexit
 import logging
 import os
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 import dotenv
-import requests
-from requests.adapters import HTTPAdapter
+
+MESSAGE_LIMIT = 4096
+CAPTION_LIMIT = 1024
+SHUTDOWN_TIMEOUT = 30.0
 
 
 class TelegramBot:
     def __init__(self, token: str, chat_id: str) -> None:
         self.api_url = f'https://api.telegram.org/bot{token}/'
         self.chat_id = chat_id
-        self.retry_count = 10
+        self.retry_count = 5
+        self.backoff = 1.0
+        self.timeout = (5, 30)
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.request_errors = (requests.RequestException, ValueError)
         self.session = requests.Session()
-        self.session.mount('http://', HTTPAdapter(max_retries=5))
+        self.session.mount('https://', HTTPAdapter(max_retries=2))
 
     def send_request(self, url, data, files=None):
         for attempt in range(self.retry_count):
+            retry_after = None
             try:
-                response = self.session.post(url, data=data, files=files)
+                response = self.session.post(url, data=data, files=files, timeout=self.timeout)
                 if response.status_code == 200:
                     return True
                 logging.warning(f'Retry {attempt + 1}: Sending failed with status code {response.status_code}')
-            except requests.RequestException as e:
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after')
+            except self.request_errors as e:
                 logging.error(f'Request failed: {e}')
-                self.session = requests.Session()
-        try:
-            response = requests.post(url, data=data, files=files)
-            logging.info(f'Final attempt using direct requests.post: {response}')
-            return response.status_code == 200
-        except requests.RequestException as e:
-            logging.error(f'Final attempt failed: {e}')
-            return False
+            if attempt + 1 < self.retry_count:
+                time.sleep(retry_after or self.backoff * 2 ** attempt)
+                for file in (files or {}).values():
+                    file.seek(0)
+        return False
 
     def send_message(self, message: str) -> bool:
         send_data = {'chat_id': self.chat_id, 'text': message}
@@ -41,24 +55,133 @@ class TelegramBot:
     def send_document(self, file_path: str, caption: str = '') -> bool:
         send_data = {'chat_id': self.chat_id}
         if caption:
-            send_data['caption'] = caption
+            send_data['caption'] = caption[-CAPTION_LIMIT:]
         url = urljoin(self.api_url, 'sendDocument')
         with open(file_path, 'rb') as document:
             files = {'document': document}
             return self.send_request(url, send_data, files=files)
 
 
-if 'TG_TOKEN' not in os.environ:
-    dotenv.load_dotenv()
+class LogBot:
+    def send_message(self, message: str) -> bool:
+        logging.info(f'Telegram disabled, message: {message}')
+        return True
+
+    def send_document(self, file_path: str, caption: str = '') -> bool:
+        logging.info(f'Telegram disabled, document: {file_path} {caption}')
+        return True
+
+
+def split_message(message: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    chunks = []
+    current = ''
+    for line in message.split('\n'):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f'{current}\n{line}' if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class NotificationDispatcher:
+    def __init__(self, bot: Union[TelegramBot, LogBot]) -> None:
+        self.bot = bot
+        self.queue: queue.Queue[Optional[Tuple[str, str, str]]] = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name='telegram', daemon=True)
+        self.worker.start()
+
+    def send_message(self, message: str) -> None:
+        self.queue.put(('message', message, ''))
+
+    def send_document(self, file_path: str, caption: str = '') -> None:
+        self.queue.put(('document', file_path, caption))
+
+    def drain(self, first: Tuple[str, str, str]) -> Tuple[List[Tuple[str, str, str]], bool]:
+        items = [first]
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return items, False
+            if item is None:
+                return items, True
+            items.append(item)
+
+    def dispatch(self, items: List[Tuple[str, str, str]]) -> None:
+        messages = []
+        for kind, payload, caption in items:
+            if kind == 'message':
+                messages.append(payload)
+                continue
+            for chunk in split_message('\n'.join(messages)):
+                self.bot.send_message(chunk)
+            messages = []
+            self.bot.send_document(payload, caption)
+        for chunk in split_message('\n'.join(messages)):
+            self.bot.send_message(chunk)
+
+    def run(self) -> None:
+        stopped = False
+        while not stopped:
+            item = self.queue.get()
+            if item is None:
+                break
+            items, stopped = self.drain(item)
+            try:
+                self.dispatch(items)
+            except Exception as exc:
+                logging.error(f'Notification dispatch failed: {exc}')
+
+    def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+        self.queue.put(None)
+        self.worker.join(timeout)
+        if self.worker.is_alive():
+            logging.warning(f'Notification queue not flushed within {timeout}s, dropping pending messages')
+            return False
+        return True
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+_lock = threading.Lock()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    global _dispatcher
+    with _lock:
+        if _dispatcher is None:
+            if 'TG_TOKEN' not in os.environ:
+                dotenv.load_dotenv()
+            if os.getenv('TG_TOKEN'):
+                bot = TelegramBot(token=os.getenv('TG_TOKEN'), chat_id=os.getenv('TG_CHAT_ID'))
+            else:
+                bot = LogBot()
+            _dispatcher = NotificationDispatcher(bot)
+            atexit.register(_dispatcher.close)
+        return _dispatcher
+
 
-TG_TOKEN = os.getenv('TG_TOKEN')
-TG_CHAT_ID = os.getenv('TG_CHAT_ID')
-BOT = TelegramBot(token=TG_TOKEN, chat_id=TG_CHAT_ID)
+def shutdown(timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+    global _dispatcher
+    with _lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is None:
+        return True
+    atexit.unregister(dispatcher.close)
+    return dispatcher.close(timeout)
 
 
 def send_message(message: str) -> None:
-    BOT.send_message(message=message)
+    get_dispatcher().send_message(message=message)
 
 
 def send_document(file_path: str, caption: str = '') -> None:
-    BOT.send_document(file_path=file_path, caption=caption)
+    get_dispatcher().send_document(file_path=file_path, caption=caption)
@@ -0,0 +1,113 @@
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from src.logger import worker_logging
+from src.models import Performance
+from src.upsert import BATCH_SIZE, UpsertResult
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEYS = ('banner', 'date')
+MAX_ATTEMPTS = 3
+START_METHOD = 'spawn'
+
+
+def supports_parallel(engine: Engine) -> bool:
+    return engine.dialect.name != 'sqlite'
+
+
+def partition_frame(df: pd.DataFrame, partitions: int, partition_by: str = 'banner') -> List[pd.DataFrame]:
+    if partition_by not in PARTITION_KEYS:
+        raise ValueError(f'Unknown partition key {partition_by}, expected one of: {", ".join(PARTITION_KEYS)}')
+
+    if partition_by == 'banner':
+        codes = pd.util.hash_array(df['banner_id'].to_numpy()) % partitions
+    else:
+        dates = sorted(df['date'].unique())
+        date_codes = {day: index % partitions for index, day in enumerate(dates)}
+        codes = df['date'].map(date_codes).to_numpy()
+
+    frames = [df[codes == code] for code in range(partitions)]
+    return [frame for frame in frames if not frame.empty]
+
+
+def load_partition(url: str, df: pd.DataFrame, batch_size: int, incremental: bool,
+                   layout: str) -> Tuple[int, pd.DataFrame, UpsertResult]:
+    from src.db import create_db_engine
+    from src.rollup import rollup_keys
+    from src.sync import sync_performance, write_changed
+
+    engine = create_db_engine(url, poolclass=NullPool)
+    try:
+        with engine.begin() as connection:
+            write = sync_performance if incremental else write_changed
+            changed, result = write(connection, df, batch_size, layout)
+            return len(df) - len(changed), rollup_keys(changed), result
+    finally:
+        engine.dispose()
+
+
+def load_performance_parallel(engine: Engine, df: pd.DataFrame, workers: int, batch_size: int = BATCH_SIZE,
+                              incremental: bool = False, partition_by: str = 'banner',
+                              max_attempts: int = MAX_ATTEMPTS,
+                              layout: str = 'wide') -> Tuple[int, pd.DataFrame, UpsertResult]:
+    if incremental and partition_by != 'banner':
+        logger.info('Incremental sync keeps per-banner watermarks, partitioning by banner instead of date')
+        partition_by = 'banner'
+
+    partitions = partition_frame(df, workers, partition_by)
+    url = engine.url.render_as_string(hide_password=False)
+    logger.info(f'Loading {len(df)} Performance rows in {len(partitions)} partitions on {workers} processes')
+
+    skipped = 0
+    changed: List[pd.DataFrame] = []
+    result = UpsertResult(Performance.__tablename__)
+    attempts = {index: 0 for index in range(len(partitions))}
+    failures: Dict[int, BaseException] = {}
+
+    context = multiprocessing.get_context(START_METHOD)
+    with worker_logging(context) as (initializer, initargs):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer,
+                                 initargs=initargs) as executor:
+            pending: Dict[Future, int] = {}
+
+            def submit(index: int) -> None:
+                attempts[index] += 1
+                future = executor.submit(load_partition, url, partitions[index], batch_size, incremental,
+                                             layout)
+                pending[future] = index
+
+            for index in attempts:
+                submit(index)
+
+            while pending:
+                future = next(iter(pending))
+                index = pending.pop(future)
+                try:
+                    partition_skipped, partition_changed, partition_result = future.result()
+                except Exception as exc:
+                    if attempts[index] < max_attempts:
+                        logger.warning(f'Partition {index} failed and was rolled back, retry {attempts[index]}/'
+                                       f'{max_attempts - 1}: {exc}')
+                        submit(index)
+                    else:
+                        logger.error(f'Partition {index} failed after {attempts[index]} attempts: {exc}')
+                        failures[index] = exc
+                    continue
+
+                skipped += partition_skipped
+                changed.append(partition_changed)
+                result += partition_result
+                logger.info(f'Partition {index}: {partition_result}')
+
+    if failures:
+        rows = sum(len(partitions[index]) for index in failures)
+        raise RuntimeError(f'{len(failures)}/{len(partitions)} Performance partitions ({rows} rows) failed to load '
+                           f'and were rolled back: {failures}')
+    return skipped, pd.concat(changed, ignore_index=True) if changed else df.iloc[:0], result
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, ContextManager, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        summary = asdict(self)
+        summary['seconds'] = round(self.seconds, 4)
+        if self.seconds > 0:
+            summary['rows_per_second'] = round(self.rows / self.seconds, 1)
+            summary['bytes_per_second'] = round(self.bytes / self.seconds, 1)
+        return summary
+
+
+class StageTimer:
+    def __init__(self, rows: int = 0, bytes: int = 0) -> None:
+        self.rows = rows
+        self.bytes = bytes
+
+
+class RunProfile:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.stages: Dict[str, StageStats] = defaultdict(StageStats)
+        self.statements: Dict[str, StageStats] = defaultdict(StageStats)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.sections: Dict[str, List[Any]] = defaultdict(list)
+        self.engines = weakref.WeakSet()
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, bytes: int = 0) -> ContextManager[StageTimer]:
+        timer = StageTimer(rows, bytes)
+        started = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            seconds = time.perf_counter() - started
+            self.record(name, seconds, timer.rows, timer.bytes)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'{name} took {seconds:.4f}s', extra={'stage': name, 'duration': round(seconds, 6),
+                                                                    'rows': timer.rows})
+
+    def record(self, name: str, seconds: float, rows: int = 0, bytes: int = 0) -> None:
+        with self.lock:
+            stats = self.stages[name]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.rows += rows
+            stats.bytes += bytes
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def add_section(self, name: str, value: Any) -> None:
+        with self.lock:
+            self.sections[name].append(value)
+
+    def record_statement(self, statement: str, seconds: float, rows: int) -> None:
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        with self.lock:
+            stats = self.statements[kind]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.rows += max(rows, 0)
+
+    def instrument(self, engine: Engine) -> Engine:
+        if engine in self.engines:
+            return engine
+        self.engines.add(engine)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info['profile_started'].pop()
+            rows = len(parameters) if executemany else cursor.rowcount
+            self.record_statement(statement, time.perf_counter() - started, rows)
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(context):
+            if context.connection is not None and context.connection.info.get('profile_started'):
+                context.connection.info['profile_started'].pop()
+
+        return engine
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'started_at': self.started_at,
+                'wall_seconds': round(time.perf_counter() - self.started, 4),
+                'stages': {name: stats.summary() for name, stats in sorted(self.stages.items())},
+                'statements': {kind: stats.summary() for kind, stats in sorted(self.statements.items())},
+                'counters': dict(self.counters),
+                **{name: values for name, values in self.sections.items()}
+            }
+
+    def write(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as summary_file:
+            json.dump(self.summary(), summary_file, indent=2, default=str)
+        logger.info(f'Run summary written to {path}')
+        return path
+
+    def log(self) -> None:
+        for name, stats in sorted(self.stages.items()):
+            logger.info(f'Stage {name}: {stats.calls} calls, {stats.seconds:.3f}s, {stats.rows} rows, '
+                        f'{stats.bytes} bytes')
+        for kind, stats in sorted(self.statements.items()):
+            logger.info(f'SQL {kind}: {stats.calls} statements, {stats.seconds:.3f}s, {stats.rows} rows')
+
+
+PROFILE = RunProfile()
+
+
+def stage(name: str, rows: int = 0, bytes: int = 0) -> ContextManager[StageTimer]:
+    return PROFILE.stage(name, rows, bytes)
+
+
+@contextmanager
+def profiled(output_path: str, profiler: Optional[str] = None) -> ContextManager[None]:
+    if profiler is None:
+        yield
+        return
+    if profiler not in PROFILERS:
+        raise ValueError(f'Unknown profiler {profiler}, expected one of: {", ".join(PROFILERS)}')
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        instrument_profiler = Profiler()
+        instrument_profiler.start()
+        try:
+            yield
+        finally:
+            instrument_profiler.stop()
+            with open(f'{output_path}.html', 'w', encoding='utf-8') as profile_file:
+                profile_file.write(instrument_profiler.output_html())
+            logger.info(f'pyinstrument profile written to {output_path}.html')
+    else:
+        import cProfile
+
+        c_profiler = cProfile.Profile()
+        c_profiler.enable()
+        try:
+            yield
+        finally:
+            c_profiler.disable()
+            c_profiler.dump_stats(f'{output_path}.prof')
+            logger.info(f'cProfile stats written to {output_path}.prof')
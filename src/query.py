@@ -0,0 +1,172 @@
+import functools
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import Select, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.models import Campaign, LoadMarker, Performance
+from src.rollup import derive_ratios, metric_sum
+from src.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+FETCH_CHUNK_SIZE = 10000
+RESULT_TTL = 300.0
+
+Frame = Union[pd.DataFrame, pa.Table]
+
+
+class ResultCache:
+    def __init__(self, ttl: float = RESULT_TTL) -> None:
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple, Tuple[float, pd.DataFrame]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1].copy()
+
+    def put(self, key: Tuple, df: pd.DataFrame) -> None:
+        now = time.monotonic()
+        with self.lock:
+            for expired in [entry for entry, (stored, _) in self.entries.items() if now - stored > self.ttl]:
+                del self.entries[expired]
+            self.entries[key] = (now, df.copy())
+
+    def invalidate(self) -> None:
+        with self.lock:
+            if self.entries:
+                logger.info(f'Query result cache invalidated, {len(self.entries)} entries dropped')
+            self.entries.clear()
+
+
+RESULT_CACHE = ResultCache()
+
+
+def invalidate_results() -> None:
+    RESULT_CACHE.invalidate()
+
+
+def mark_loaded(connection: Connection, table_name: str = Performance.__tablename__) -> None:
+    upsert(connection, LoadMarker.__table__, [{'table_name': table_name, 'version': time.time_ns()}])
+
+
+def load_marker(engine: Engine, table_name: str = Performance.__tablename__) -> Optional[int]:
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(LoadMarker.version).where(LoadMarker.table_name == table_name))
+    except SQLAlchemyError:
+        logger.warning(f'Could not read the {LoadMarker.__tablename__} marker, caching by TTL only')
+        return None
+
+
+def cached(query: Callable[..., pd.DataFrame]) -> Callable[..., Frame]:
+    @functools.wraps(query)
+    def wrapper(engine: Engine, *args, arrow: bool = False, use_cache: bool = True, **kwargs) -> Frame:
+        df = None
+        if use_cache:
+            key = (query.__name__, str(engine.url), load_marker(engine), repr(args), repr(sorted(kwargs.items())))
+            df = RESULT_CACHE.get(key)
+        if df is None:
+            df = query(engine, *args, **kwargs)
+            if use_cache:
+                RESULT_CACHE.put(key, df)
+        return pa.Table.from_pandas(df, preserve_index=False) if arrow else df
+
+    return wrapper
+
+
+def iter_frames(engine: Engine, query: Select, chunk_size: int = FETCH_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        columns = list(result.keys())
+        for rows in result.partitions(chunk_size):
+            yield pd.DataFrame(rows, columns=columns)
+
+
+def fetch_frame(engine: Engine, query: Select, chunk_size: int = FETCH_CHUNK_SIZE) -> pd.DataFrame:
+    frames = list(iter_frames(engine, query, chunk_size))
+    if not frames:
+        return pd.DataFrame(columns=[column.name for column in query.selected_columns])
+    return pd.concat(frames, ignore_index=True)
+
+
+def metric_sums() -> List[Any]:
+    return [
+        metric_sum(Performance.base_shows).label('shows'),
+        metric_sum(Performance.base_clicks).label('clicks'),
+        metric_sum(Performance.base_spent).label('spent'),
+    ]
+
+
+@cached
+def spend_by_campaign(engine: Engine, start: date, end: date,
+                      campaign_ids: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    query = (
+        select(Performance.campaign_id, *metric_sums())
+        .where(Performance.date.between(start, end))
+        .group_by(Performance.campaign_id)
+    )
+    if campaign_ids is not None:
+        query = query.where(Performance.campaign_id.in_(list(campaign_ids)))
+
+    totals = query.subquery()
+    query = (
+        select(totals, Campaign.campaign_name)
+        .outerjoin(Campaign, Campaign.campaign_id == totals.c.campaign_id)
+        .order_by(totals.c.spent.desc())
+    )
+    return derive_ratios(fetch_frame(engine, query))
+
+
+@cached
+def campaign_daily(engine: Engine, campaign_id: int, start: date, end: date) -> pd.DataFrame:
+    query = (
+        select(Performance.date, *metric_sums())
+        .where(Performance.campaign_id == campaign_id, Performance.date.between(start, end))
+        .group_by(Performance.date)
+        .order_by(Performance.date)
+    )
+    return derive_ratios(fetch_frame(engine, query))
+
+
+@cached
+def top_banners_by_ctr(engine: Engine, start: date, end: date, limit: int = 10,
+                       min_shows: int = 1000) -> pd.DataFrame:
+    shows = metric_sum(Performance.base_shows)
+    ctr = metric_sum(Performance.base_clicks) * 100.0 / shows
+    query = (
+        select(Performance.banner_id, *metric_sums())
+        .where(Performance.date.between(start, end))
+        .group_by(Performance.banner_id)
+        .having(shows >= max(min_shows, 1))
+        .order_by(ctr.desc(), Performance.banner_id)
+        .limit(limit)
+    )
+    return derive_ratios(fetch_frame(engine, query))
+
+
+@cached
+def banner_performance(engine: Engine, banner_ids: Tuple[int, ...], start: date, end: date,
+                       columns: Tuple[str, ...] = ('base_shows', 'base_clicks', 'base_spent')) -> pd.DataFrame:
+    query = (
+        select(Performance.banner_id, Performance.date, *[Performance.__table__.c[column] for column in columns])
+        .where(Performance.banner_id.in_(list(banner_ids)), Performance.date.between(start, end))
+        .order_by(Performance.banner_id, Performance.date)
+    )
+    return fetch_frame(engine, query)
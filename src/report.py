@@ -1,30 +1,29 @@
 import json
-import locale
 import logging
 import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from enum import Enum
-from typing import ContextManager, Dict, List, Union
+from typing import ContextManager, Dict, Iterator, List, NamedTuple, Optional, Union
 
-import pandas as pd
 import requests
 
+from src.hierarchy import AccountHierarchy
+from src.manifest import RunManifest
 from src.notification import send_message
+from src.profiling import PROFILE, stage
+from src.ratelimit import TokenBucket
+from src.staging import write_statistics_records
+from src.transport import CACHE_TTL, ResponseCache, Transport, TransportMetrics
 
 logger = logging.getLogger(__name__)
 
-
-@contextmanager
-def locale_manager(locale_name: str) -> ContextManager[None]:
-    try:
-        locale.setlocale(category=locale.LC_ALL, locale=locale_name)
-    except locale.Error:
-        locale.setlocale(category=locale.LC_ALL, locale='ru')
-    try:
-        yield
-    finally:
-        locale.setlocale(category=locale.LC_ALL, locale='')
+STATISTICS_BATCH_SIZE = 100
+WRITE_QUEUE_SIZE = 8
+PAGE_SIZE = 250
+DROPPED_COLUMNS = {'base_vk'}
 
 
 class DateRange(Enum):
@@ -50,104 +49,294 @@ class DateRange(Enum):
             return start_date, today
 
 
+class DateWindow(NamedTuple):
+    start: date
+    end: date
+
+    def get_date_range(self, return_type: str = 'str') -> Union[str, tuple]:
+        if return_type not in ['str', 'datetime']:
+            raise ValueError('return_type should be str or datetime')
+
+        if return_type == 'str':
+            return self.start.strftime('%Y-%m-%d'), self.end.strftime('%Y-%m-%d')
+        else:
+            return self.start, self.end
+
+    def shards(self, days: int) -> List['DateWindow']:
+        if days < 1:
+            raise ValueError('days should be positive')
+
+        shards = []
+        start = self.start
+        while start <= self.end:
+            end = min(start + timedelta(days=days - 1), self.end)
+            shards.append(DateWindow(start, end))
+            start = end + timedelta(days=1)
+        return shards
+
+
+Period = Union[DateRange, DateWindow]
+
+
+class StatisticsError(requests.RequestException):
+    pass
+
+
 class MyTargetAPI:
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, rate_limiter: Optional[TokenBucket] = None, pool_size: int = 10,
+                 max_retries: int = 5, backoff: float = 1.0, cache_dir: Optional[str] = None,
+                 cache_ttl: float = CACHE_TTL):
         self.access_token = access_token
-        self.base_url = 'https://target.my.com'
+        self.base_url = os.getenv('MYTARGET_BASE_URL', 'https://target.my.com')
+        self.rate_limiter = rate_limiter
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache = ResponseCache(cache_dir, cache_ttl) if cache_dir else None
+        self.metrics = TransportMetrics()
 
     @contextmanager
-    def session(self) -> ContextManager[requests.Session]:
-        session = requests.Session()
-        session.headers.update({'Authorization': f'Bearer {self.access_token}'})
+    def session(self) -> ContextManager[Transport]:
+        transport = Transport(
+            headers={'Authorization': f'Bearer {self.access_token}'},
+            pool_size=self.pool_size,
+            max_retries=self.max_retries,
+            backoff=self.backoff,
+            rate_limiter=self.rate_limiter,
+            cache=self.cache,
+            metrics=self.metrics
+        )
         try:
-            yield session
+            yield transport
         finally:
-            session.close()
+            transport.close()
+
+    def get_paginated(self, session: Transport, url: str, params: Optional[Dict] = None,
+                      limit: int = PAGE_SIZE, cache: bool = False) -> Iterator[Dict]:
+        offset = 0
+        while True:
+            data = session.get_json(url, params={**(params or {}), 'limit': limit, 'offset': offset}, cache=cache)
+            items = data['items']
+            yield from items
+
+            offset += len(items)
+            if len(items) < limit or ('count' in data and offset >= data['count']):
+                break
 
-    def get_campaigns(self, session: requests.Session) -> List[Dict[str, Union[int, str]]]:
+    def get_campaigns(self, session: Transport) -> List[Dict[str, Union[int, str]]]:
         url = f'{self.base_url}/api/v2/campaigns.json'
-        response = session.get(url)
-        return [{'campaign_id': item['id'], 'campaign_name': item['name']} for item in response.json()['items']]
+        params = {'fields': 'id,name'}
+        return [{'campaign_id': item['id'], 'campaign_name': item['name']}
+                for item in self.get_paginated(session, url, params=params, cache=True)]
 
-    def get_banners(self, session: requests.Session, campaign_id: int) -> List[Dict[str, Union[int, str]]]:
+    def get_banners(self, session: Transport,
+                    campaign_id: Optional[int] = None) -> List[Dict[str, Union[int, str]]]:
         url = f'{self.base_url}/api/v2/banners.json'
-        params = {'_campaign_id': campaign_id}
-        response = session.get(url, params=params)
-        return [{'ad_group_id': item['ad_group_id'], 'banner_id': item['id']} for item in response.json()['items']]
-
-    def get_statistics(self, session: requests.Session, banner_id: int, date_range: DateRange) -> Dict:
-        retry_count = 0
-        while retry_count < 3:
-            start_date, end_date = date_range.get_date_range()
-
-            url = f'{self.base_url}/api/v2/statistics/banners/day.json'
-            params = {
-                'id': banner_id,
-                'date_from': start_date,
-                'date_to': end_date,
-                'metrics': 'all'
-            }
-            response = session.get(url, params=params)
-
-            statistics = response.json()
+        params = {'fields': 'id,campaign_id,ad_group_id'}
+        if campaign_id is not None:
+            params['_campaign_id'] = campaign_id
+        return [{'campaign_id': item['campaign_id'], 'ad_group_id': item['ad_group_id'], 'banner_id': item['id']}
+                for item in self.get_paginated(session, url, params=params, cache=True)]
+
+    def get_statistics(self, session: Transport, banner_id: Union[int, List[int]],
+                       date_range: Period) -> Dict:
+        start_date, end_date = date_range.get_date_range()
+        if isinstance(banner_id, list):
+            banner_id = ','.join(str(item) for item in banner_id)
+
+        url = f'{self.base_url}/api/v2/statistics/banners/day.json'
+        params = {
+            'id': banner_id,
+            'date_from': start_date,
+            'date_to': end_date,
+            'metrics': 'all'
+        }
+
+        for retry_count in range(3):
+            statistics = session.get_json(url, params=params)
             if 'items' in statistics:
                 return statistics
+            logger.warning(f'Retry {retry_count + 1}: no statistics for banner_id: {banner_id}: {statistics}')
 
-        if retry_count == 3:
-            logger.error(f'Failed to get statistics for banner_id: {banner_id}')
-            raise requests.RequestException('Failed to get statistics for banner_id: {banner_id}')
+        logger.error(f'Failed to get statistics for banner_id: {banner_id}')
+        raise StatisticsError(f'Failed to get statistics for banner_id: {banner_id}')
 
+    def get_statistics_batch(self, session: Transport, banner_ids: List[int], date_range: Period,
+                             batch_size: int = STATISTICS_BATCH_SIZE) -> Dict[int, List[Dict]]:
+        rows = {}
+        for start in range(0, len(banner_ids), batch_size):
+            rows.update(self._get_statistics_chunk(session, banner_ids[start:start + batch_size], date_range))
+        return rows
 
-def download_statistics(access_token: str, statistics_file: str, date_range: DateRange) -> None:
-    logger.info(f'Starting statistics download...')
+    def _get_statistics_chunk(self, session: Transport, banner_ids: List[int],
+                              date_range: Period) -> Dict[int, List[Dict]]:
+        try:
+            data = self.get_statistics(session, banner_ids, date_range)
+        except StatisticsError:
+            if len(banner_ids) == 1:
+                raise
+            middle = len(banner_ids) // 2
+            logger.warning(f'Statistics batch of {len(banner_ids)} banners failed, splitting in two...')
+            return {
+                **self._get_statistics_chunk(session, banner_ids[:middle], date_range),
+                **self._get_statistics_chunk(session, banner_ids[middle:], date_range)
+            }
 
-    log_messages = []
+        rows = {banner_id: [] for banner_id in banner_ids}
+        rows.update({item['id']: item['rows'] for item in data['items']})
+        return rows
 
-    api = MyTargetAPI(access_token)
-    with api.session() as session:
-        campaigns = api.get_campaigns(session)
-        banners_group = [api.get_banners(session, campaign['campaign_id']) for campaign in campaigns]
 
-        flattened_data = [{
-            'campaign_id': campaign['campaign_id'],
-            'campaign_name': campaign['campaign_name'],
-            'ad_group_id': banner['ad_group_id'],
-            'banner_id': banner['banner_id']
-        } for campaign in campaigns for banners in banners_group for banner in banners]
+def flatten_record(item: Dict, row: Dict) -> Dict:
+    record = {
+        'campaign_id': item['campaign_id'],
+        'campaign_name': item['campaign_name'],
+        'ad_group_id': item['ad_group_id'],
+        'banner_id': item['banner_id'],
+    }
+    for group, values in row.items():
+        if not isinstance(values, dict):
+            record[group] = values
+            continue
+        for name, value in values.items():
+            column = f'{group}_{name}'
+            if column not in DROPPED_COLUMNS:
+                record[column] = value
+    return record
 
-        for item in flattened_data:
-            campaign_id = item['campaign_id']
-            ad_group_id = item['ad_group_id']
-            banner_id = item['banner_id']
 
-            formatted_statistics_file = statistics_file.\
-                format(campaign_id=campaign_id, ad_group_id=ad_group_id, banner_id=banner_id)
+def format_statistics_file(statistics_file: str, item: Dict) -> str:
+    return statistics_file.format(
+        campaign_id=item['campaign_id'],
+        ad_group_id=item['ad_group_id'],
+        banner_id=item['banner_id']
+    )
 
-            if os.path.exists(formatted_statistics_file):
-                log_messages.append(f'{campaign_id}_{ad_group_id}_{banner_id}: statistics already exists...')
-                continue
 
-            data = api.get_statistics(session, item['banner_id'], date_range)
+def save_banner_statistics(item: Dict, rows: List[Dict], formatted_statistics_file: str) -> str:
+    with stage('download.flatten', rows=len(rows)):
+        records = [flatten_record(item, row) for row in rows]
 
-            rows = data['items'][0]['rows']
+    with stage('download.write', rows=len(records)) as timer:
+        write_statistics_records(records, formatted_statistics_file)
+        timer.bytes = os.path.getsize(formatted_statistics_file)
 
-            statistics = [{
-                'campaign_id': item['campaign_id'],
-                'campaign_name': item['campaign_name'],
-                'ad_group_id': item['ad_group_id'],
-                'banner_id': item['banner_id'],
-                **{f'{k1}_{k2}' if isinstance(v1, dict) else k1: v2 for k1, v1 in row.items() for k2, v2 in
-                   (v1.items() if isinstance(v1, dict) else [(k1, v1)])}
-            } for row in rows]
+    logger.info(f'Report {formatted_statistics_file} saved...')
+    return f'{item["campaign_id"]}_{item["ad_group_id"]}_{item["banner_id"]}: statistics saved...'
 
-            df = pd.DataFrame(statistics)
-            if 'base_vk' in df.columns:
-                df.drop(columns=['base_vk'], inplace=True)
 
-            df.to_json(formatted_statistics_file, orient='records', index=False, force_ascii=False, indent=2)
+def save_batch(items: List[Dict], rows: Dict[int, List[Dict]], statistics_file: str,
+               manifest: Optional[RunManifest] = None) -> List[str]:
+    log_messages = []
+    for item in items:
+        path = format_statistics_file(statistics_file, item)
+        log_messages.append(save_banner_statistics(item, rows[item['banner_id']], path))
+        if manifest is not None:
+            manifest.record_download(item['banner_id'], path, len(rows[item['banner_id']]))
+
+    if manifest is not None:
+        manifest.save()
+    return log_messages
+
 
-            log_messages.append(f'{campaign_id}_{ad_group_id}_{banner_id}: statistics saved...')
-            logger.info(f'Report {formatted_statistics_file} saved...')
+class BoundedExecutor(Executor):
+    def __init__(self, executor: Executor, bound: int = WRITE_QUEUE_SIZE) -> None:
+        self.executor = executor
+        self.slots = threading.BoundedSemaphore(bound)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with stage('download.writer.backpressure'):
+            self.slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
 
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def download_batch(api: MyTargetAPI, session: Transport, items: List[Dict], statistics_file: str,
+                   date_range: Period, writer: Executor, manifest: Optional[RunManifest] = None) -> Future:
+    with stage('download.api.statistics') as timer:
+        rows = api.get_statistics_batch(session, [item['banner_id'] for item in items], date_range)
+        timer.rows = sum(len(banner_rows) for banner_rows in rows.values())
+    return writer.submit(save_batch, items, rows, statistics_file, manifest)
+
+
+def download_statistics(access_token: str, statistics_file: str, date_range: Period, concurrency: int = 1,
+                        rate_limit: Optional[float] = None, batch_size: int = STATISTICS_BATCH_SIZE,
+                        date_ranges: Optional[Dict[int, DateWindow]] = None,
+                        cache_dir: Optional[str] = None, manifest: Optional[RunManifest] = None) -> AccountHierarchy:
+    logger.info(f'Starting statistics download...')
+
+    log_messages = []
+
+    rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+    api = MyTargetAPI(access_token, rate_limiter=rate_limiter, pool_size=max(concurrency, 1), cache_dir=cache_dir)
+    with api.session() as session:
+        with stage('download.api.hierarchy') as timer:
+            hierarchy = AccountHierarchy.fetch(api, session)
+            timer.rows = len(hierarchy)
+
+        pending = []
+        for item in hierarchy.items():
+            path = format_statistics_file(statistics_file, item)
+            if manifest.downloaded(item['banner_id'], path) if manifest is not None else os.path.exists(path):
+                log_messages.append(f'{item["campaign_id"]}_{item["ad_group_id"]}_{item["banner_id"]}: '
+                                    f'statistics already exists...')
+            else:
+                pending.append(item)
+
+        windows = {}
+        for item in pending:
+            window = (date_ranges or {}).get(item['banner_id'], date_range)
+            windows.setdefault(window, []).append(item)
+
+        batches = [
+            (window, items[start:start + batch_size])
+            for window, items in windows.items() for start in range(0, len(items), batch_size)
+        ]
+        with BoundedExecutor(ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')) as writer:
+            if concurrency > 1:
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='download') as executor:
+                    saved = list(executor.map(
+                        lambda batch: download_batch(api, session, batch[1], statistics_file, batch[0], writer,
+                                                     manifest),
+                        batches
+                    ))
+            else:
+                saved = [download_batch(api, session, batch, statistics_file, window, writer, manifest)
+                         for window, batch in batches]
+
+            for future in saved:
+                log_messages.extend(future.result())
+
+    api.metrics.log()
+    PROFILE.add_section('http', api.metrics.summary())
     send_message('\n'.join(log_messages))
     logger.info(f'All statistics download finished...')
+    return hierarchy
+
+
+def download_accounts(access_tokens: List[str], statistics_file: str, date_range: Period, concurrency: int = 1,
+                      rate_limit: Optional[float] = None, batch_size: int = STATISTICS_BATCH_SIZE,
+                      date_ranges: Optional[Dict[int, DateWindow]] = None,
+                      cache_dir: Optional[str] = None, manifest: Optional[RunManifest] = None) -> AccountHierarchy:
+    if len(access_tokens) == 1:
+        return download_statistics(access_tokens[0], statistics_file, date_range, concurrency, rate_limit, batch_size,
+                                   date_ranges, cache_dir, manifest)
+
+    hierarchy = AccountHierarchy()
+    with ThreadPoolExecutor(max_workers=len(access_tokens), thread_name_prefix='account') as executor:
+        futures = [
+            executor.submit(download_statistics, access_token, statistics_file, date_range, concurrency,
+                            rate_limit, batch_size, date_ranges, cache_dir, manifest)
+            for access_token in access_tokens
+        ]
+        for future in futures:
+            hierarchy.update(future.result())
+    return hierarchy
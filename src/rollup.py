@@ -0,0 +1,111 @@
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import BigInteger, Column, Integer, Table, cast, delete, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from src.models import AdGroupDaily, CampaignDaily, Performance
+from src.storage import create_tables
+from src.upsert import BATCH_SIZE, KEY_CHUNK_SIZE, batched, to_records
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_KEYS: Dict[Table, List[str]] = {
+    CampaignDaily.__table__: ['campaign_id'],
+    AdGroupDaily.__table__: ['ad_group_id', 'campaign_id'],
+}
+ROLLUP_SUMS = {
+    'shows': 'base_shows',
+    'clicks': 'base_clicks',
+    'spent': 'base_spent',
+    'video_started': 'video_started',
+    'video_viewed_100_percent': 'video_viewed_100_percent',
+}
+
+
+def derive_ratios(df: pd.DataFrame) -> pd.DataFrame:
+    shows = df['shows'].where(df['shows'] > 0)
+    clicks = df['clicks'].where(df['clicks'] > 0)
+    df['ctr'] = df['clicks'] / shows * 100
+    df['cpc'] = df['spent'] / clicks
+    df['cpm'] = df['spent'] / shows * 1000
+    return df
+
+
+def metric_sum(column: Column):
+    if isinstance(column.type, Integer):
+        return func.sum(cast(column, BigInteger))
+    return func.sum(column)
+
+
+def aggregate(connection: Connection, table: Table, *conditions) -> pd.DataFrame:
+    performance = Performance.__table__
+    group = [performance.c[column] for column in ROLLUP_KEYS[table]] + [performance.c.date]
+    sums = [metric_sum(performance.c[source]).label(name) for name, source in ROLLUP_SUMS.items()]
+    query = select(*group, *sums).where(*conditions).group_by(*group)
+
+    rows = connection.execute(query).all()
+    df = pd.DataFrame(rows, columns=[*ROLLUP_KEYS[table], 'date', *ROLLUP_SUMS])
+    for column in ROLLUP_SUMS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return derive_ratios(df)
+
+
+def write_rollup(connection: Connection, table: Table, df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> int:
+    records = to_records(df)
+    for batch in batched(records, batch_size):
+        connection.execute(insert(table), batch)
+    return len(records)
+
+
+def refresh_rollup(connection: Connection, table: Table, df: pd.DataFrame) -> int:
+    key = ROLLUP_KEYS[table][0]
+    keys = df[[key, 'date']].drop_duplicates()
+
+    refreshed = 0
+    for day, ids in keys.groupby('date')[key]:
+        ids = ids.tolist()
+        for start in range(0, len(ids), KEY_CHUNK_SIZE):
+            chunk = ids[start:start + KEY_CHUNK_SIZE]
+            connection.execute(delete(table).where(table.c.date == day, table.c[key].in_(chunk)))
+            performance = Performance.__table__
+            rollup = aggregate(connection, table, performance.c.date == day, performance.c[key].in_(chunk))
+            refreshed += write_rollup(connection, table, rollup)
+    return refreshed
+
+
+def rollup_keys(df: pd.DataFrame) -> pd.DataFrame:
+    columns = sorted({column for keys in ROLLUP_KEYS.values() for column in keys}) + ['date']
+    return df[columns].drop_duplicates()
+
+
+def refresh_rollups(connection: Connection, df: pd.DataFrame) -> Dict[str, int]:
+    if df.empty:
+        return {table.name: 0 for table in ROLLUP_KEYS}
+    return {table.name: refresh_rollup(connection, table, df) for table in ROLLUP_KEYS}
+
+
+def rebuild_rollups(engine: Engine, start: Optional[date] = None, end: Optional[date] = None,
+                    batch_size: int = BATCH_SIZE, layout: str = 'wide') -> Dict[str, int]:
+    create_tables(engine, layout)
+    performance = Performance.__table__
+
+    rebuilt = {}
+    for table in ROLLUP_KEYS:
+        source_conditions, rollup_conditions = [], []
+        if start is not None:
+            source_conditions.append(performance.c.date >= start)
+            rollup_conditions.append(table.c.date >= start)
+        if end is not None:
+            source_conditions.append(performance.c.date <= end)
+            rollup_conditions.append(table.c.date <= end)
+
+        with engine.begin() as connection:
+            connection.execute(delete(table).where(*rollup_conditions))
+            rebuilt[table.name] = write_rollup(connection, table, aggregate(connection, table, *source_conditions),
+                                               batch_size)
+        logger.info(f'Rebuilt {rebuilt[table.name]} {table.name} rows from {start or "the first"} to '
+                    f'{end or "the last"} date')
+    return rebuilt
@@ -0,0 +1,318 @@
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+
+from src.cache import DimensionCache
+from src.db import Dataset, LoadResult, load_dataset
+from src.hierarchy import AccountHierarchy
+from src.manifest import CHECKPOINT_ROWS, RunManifest
+from src.profiling import PROFILE, stage
+from src.query import invalidate_results
+from src.ratelimit import TokenBucket
+from src.report import (STATISTICS_BATCH_SIZE, DateWindow, MyTargetAPI, Period, format_statistics_file,
+                        save_banner_statistics)
+from src.staging import read_statistics
+from src.storage import create_tables
+from src.transport import Transport
+from src.upsert import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+LOAD_QUEUE_SIZE = 64
+
+
+@dataclass
+class AccountSummary:
+    account: str
+    banners: int = 0
+    downloaded: int = 0
+    skipped: int = 0
+    rows: int = 0
+    loaded_files: int = 0
+    load: LoadResult = field(default_factory=LoadResult)
+    errors: List[str] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        summary = (f'{self.account}: {self.banners} banners, {self.downloaded} downloaded, {self.skipped} skipped, '
+                   f'{self.loaded_files} files ({self.rows} rows) loaded')
+        if self.load.results:
+            summary += f'. {self.load}'
+        if self.errors:
+            summary += f'. {len(self.errors)} failed: {"; ".join(self.errors)}'
+        return summary
+
+
+@dataclass
+class Account:
+    name: str
+    api: MyTargetAPI
+    session: Optional[Transport] = None
+    hierarchy: Optional[AccountHierarchy] = None
+    jobs: Deque[Callable[[], None]] = field(default_factory=deque)
+    in_flight: int = 0
+
+
+class Partition(NamedTuple):
+    name: str
+    window: Period
+    statistics_file: str
+    manifest: Optional[RunManifest] = None
+
+
+@dataclass
+class LoadJob:
+    account: str
+    path: str
+    partition: Partition
+
+
+class Scheduler:
+    def __init__(self, access_tokens: List[str], statistics_file: str, date_range: Period, engine: Engine,
+                 workers: int = 4, account_concurrency: int = 2, rate_limit: Optional[float] = None,
+                 batch_size: int = STATISTICS_BATCH_SIZE, date_ranges: Optional[Dict[int, DateWindow]] = None,
+                 cache_dir: Optional[str] = None, manifest: Optional[RunManifest] = None,
+                 cache: Optional[DimensionCache] = None, incremental: bool = False,
+                 load_batch_size: int = BATCH_SIZE, processes: int = 1, queue_size: int = LOAD_QUEUE_SIZE,
+                 checkpoint_rows: int = CHECKPOINT_ROWS, partitions: Optional[List[Partition]] = None,
+                 on_partition_complete: Optional[Callable[[Partition], None]] = None,
+                 layout: str = 'wide') -> None:
+        self.partitions = partitions or [Partition('default', date_range, statistics_file, manifest)]
+        self.on_partition_complete = on_partition_complete
+        self.date_ranges = date_ranges or {}
+        self.engine = engine
+        self.workers = workers
+        self.account_concurrency = account_concurrency
+        self.batch_size = batch_size
+        self.cache = cache
+        self.incremental = incremental
+        self.load_batch_size = load_batch_size
+        self.processes = processes
+        self.layout = layout
+        self.checkpoint_rows = checkpoint_rows
+
+        self.accounts = {
+            f'account-{index}': Account(f'account-{index}', MyTargetAPI(
+                access_token, rate_limiter=TokenBucket(rate_limit) if rate_limit else None,
+                pool_size=max(account_concurrency, 1), cache_dir=cache_dir
+            ))
+            for index, access_token in enumerate(access_tokens, start=1)
+        }
+        self.summaries = {name: AccountSummary(name) for name in self.accounts}
+        self.condition = threading.Condition()
+        self.load_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.unplanned = len(self.accounts)
+        self.remaining = {partition.name: 0 for partition in self.partitions}
+        self.failed: Set[str] = set()
+
+    def pending(self) -> bool:
+        return any(account.jobs or account.in_flight for account in self.accounts.values())
+
+    def next_job(self) -> Optional[Tuple[Account, Callable[[], None]]]:
+        with self.condition:
+            while True:
+                ready = [account for account in self.accounts.values()
+                         if account.jobs and account.in_flight < self.account_concurrency]
+                if ready:
+                    account = max(ready, key=lambda candidate: len(candidate.jobs))
+                    account.in_flight += 1
+                    return account, account.jobs.popleft()
+                if not self.pending():
+                    return None
+                self.condition.wait()
+
+    def add_jobs(self, account: Account, jobs: List[Callable[[], None]]) -> None:
+        with self.condition:
+            account.jobs.extend(jobs)
+            self.condition.notify_all()
+
+    def work(self) -> None:
+        while True:
+            job = self.next_job()
+            if job is None:
+                return
+            account, run = job
+            try:
+                run()
+            except Exception as exc:
+                logger.exception(f'{account.name}: job failed')
+                self.summaries[account.name].errors.append(str(exc))
+            finally:
+                with self.condition:
+                    account.in_flight -= 1
+                    self.condition.notify_all()
+
+    def complete(self, partition: Optional[Partition] = None, units: int = 0) -> None:
+        with self.condition:
+            if partition is not None:
+                self.remaining[partition.name] -= units
+            done = [candidate for candidate in self.partitions if self.unplanned == 0
+                    and self.remaining[candidate.name] == 0 and candidate.name not in self.failed]
+            for candidate in done:
+                self.remaining[candidate.name] = -1
+
+        for candidate in done:
+            logger.info(f'Partition {candidate.name} completed')
+            if self.on_partition_complete is not None:
+                self.on_partition_complete(candidate)
+
+    def plan(self, account: Account) -> None:
+        try:
+            self.plan_partitions(account)
+        except Exception:
+            with self.condition:
+                self.failed.update(partition.name for partition in self.partitions)
+            logger.warning(f'{account.name}: planning failed, no partition will be marked complete in this run')
+            raise
+        finally:
+            with self.condition:
+                self.unplanned -= 1
+        self.complete()
+
+    def plan_partitions(self, account: Account) -> None:
+        with stage('download.api.hierarchy') as timer:
+            account.hierarchy = AccountHierarchy.fetch(account.api, account.session)
+            timer.rows = len(account.hierarchy)
+
+        summary = self.summaries[account.name]
+        summary.banners = len(account.hierarchy)
+        items = list(account.hierarchy.items())
+        with self.condition:
+            for partition in self.partitions:
+                self.remaining[partition.name] += len(items)
+
+        jobs = []
+        for partition in self.partitions:
+            windows: Dict[Period, List[Dict]] = {}
+            for item in items:
+                path = format_statistics_file(partition.statistics_file, item)
+                done = partition.manifest.downloaded(item['banner_id'], path) if partition.manifest is not None \
+                    else os.path.exists(path)
+                if done:
+                    summary.skipped += 1
+                    self.enqueue_load(account.name, path, partition)
+                else:
+                    window = self.date_ranges.get(item['banner_id'], partition.window)
+                    windows.setdefault(window, []).append(item)
+
+            jobs.extend(
+                (lambda partition=partition, window=window, batch=batch_items[start:start + self.batch_size]:
+                 self.download(account, partition, batch, window))
+                for window, batch_items in windows.items() for start in range(0, len(batch_items), self.batch_size)
+            )
+        logger.info(f'{account.name}: {len(jobs)} download jobs planned in {len(self.partitions)} partitions, '
+                    f'{summary.skipped} banners already saved')
+        self.add_jobs(account, jobs)
+
+    def download(self, account: Account, partition: Partition, items: List[Dict], window: Period) -> None:
+        with stage('download.api.statistics') as timer:
+            rows = account.api.get_statistics_batch(account.session, [item['banner_id'] for item in items], window)
+            timer.rows = sum(len(banner_rows) for banner_rows in rows.values())
+
+        for item in items:
+            path = format_statistics_file(partition.statistics_file, item)
+            save_banner_statistics(item, rows[item['banner_id']], path)
+            if partition.manifest is not None:
+                partition.manifest.record_download(item['banner_id'], path, len(rows[item['banner_id']]))
+            with self.condition:
+                self.summaries[account.name].downloaded += 1
+            self.enqueue_load(account.name, path, partition)
+
+        if partition.manifest is not None:
+            partition.manifest.save()
+
+    def enqueue_load(self, account: str, path: str, partition: Partition) -> None:
+        if partition.manifest is not None and partition.manifest.loaded(path):
+            self.complete(partition, 1)
+            return
+        with stage('scheduler.backpressure'):
+            self.load_queue.put(LoadJob(account, path, partition))
+
+    def flush(self, account: str, jobs: List[LoadJob], frames: List[pd.DataFrame]) -> None:
+        summary = self.summaries[account]
+        try:
+            non_empty = [df for df in frames if not df.empty]
+            if non_empty:
+                dataset = Dataset(pd.concat(non_empty, ignore_index=True), self.accounts[account].hierarchy)
+                summary.load += load_dataset(self.engine, dataset, self.load_batch_size, self.incremental,
+                                             cache=self.cache, processes=self.processes, layout=self.layout)
+            for partition in {job.partition for job in jobs}:
+                if partition.manifest is not None:
+                    loaded = [(job.path, len(df)) for job, df in zip(jobs, frames) if job.partition == partition]
+                    partition.manifest.record_loads([path for path, _ in loaded], [rows for _, rows in loaded])
+            summary.loaded_files += len(jobs)
+            summary.rows += sum(len(df) for df in frames)
+            invalidate_results()
+        except Exception as exc:
+            logger.exception(f'{account}: loading {len(jobs)} files failed')
+            summary.errors.append(str(exc))
+            return
+
+        for job in jobs:
+            self.complete(job.partition, 1)
+
+    def load(self) -> None:
+        buffers: Dict[str, Tuple[List[LoadJob], List[pd.DataFrame]]] = {}
+
+        def flush_all() -> None:
+            for account, (jobs, frames) in list(buffers.items()):
+                self.flush(account, jobs, frames)
+            buffers.clear()
+
+        while True:
+            try:
+                job = self.load_queue.get(timeout=1)
+            except queue.Empty:
+                flush_all()
+                continue
+            if job is None:
+                flush_all()
+                return
+
+            jobs, frames = buffers.setdefault(job.account, ([], []))
+            try:
+                frames.append(read_statistics(job.path))
+            except Exception as exc:
+                logger.exception(f'{job.account}: reading {job.path} failed')
+                self.summaries[job.account].errors.append(str(exc))
+                continue
+            jobs.append(job)
+
+            if sum(len(df) for df in frames) >= self.checkpoint_rows or self.load_queue.empty():
+                self.flush(job.account, jobs, frames)
+                del buffers[job.account]
+
+    def run(self) -> Dict[str, AccountSummary]:
+        create_tables(self.engine, self.layout)
+        loader = threading.Thread(target=self.load, name='loader')
+        loader.start()
+
+        try:
+            with ExitStack() as stack:
+                for account in self.accounts.values():
+                    account.session = stack.enter_context(account.api.session())
+                    self.add_jobs(account, [lambda account=account: self.plan(account)])
+
+                threads = [threading.Thread(target=self.work, name=f'download-{index}')
+                           for index in range(self.workers)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            self.load_queue.put(None)
+            loader.join()
+
+        for account in self.accounts.values():
+            account.api.metrics.log()
+            PROFILE.add_section('http', account.api.metrics.summary())
+        for summary in self.summaries.values():
+            logger.info(str(summary))
+        return self.summaries
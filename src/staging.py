@@ -0,0 +1,227 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import ContextManager, Dict, IO, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, Column, Date, Float, Integer
+
+from src.models import Campaign, Performance
+from src.profiling import stage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 50000
+WRITE_BUFFER_SIZE = 1024 * 1024
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+ARROW_TYPES = {
+    BigInteger: pa.int64(),
+    Integer: pa.int64(),
+    Float: pa.float64(),
+    Date: pa.date32(),
+}
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    for sql_type, data_type in ARROW_TYPES.items():
+        if isinstance(column.type, sql_type):
+            return data_type
+    return pa.string()
+
+
+def statistics_schema() -> pa.Schema:
+    columns = [Campaign.__table__.columns['campaign_name']] + [
+        column for column in Performance.__table__.columns if column.name not in ('performance_id', 'fingerprint')
+    ]
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in columns])
+
+
+def coerce_statistics(df: pd.DataFrame, schema: pa.Schema) -> Tuple[pd.DataFrame, pa.Schema]:
+    fields = []
+    for field in schema:
+        values = df[field.name]
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            values = pd.to_numeric(values, errors='coerce').astype('float64')
+            if pa.types.is_integer(field.type):
+                if (values.dropna() % 1 == 0).all():
+                    values = values.astype('Int64')
+                else:
+                    field = field.with_type(pa.float64())
+        elif pa.types.is_string(field.type):
+            values = values.astype(object).where(values.isna(), values.astype(str))
+        df[field.name] = values
+        fields.append(field)
+    return df, pa.schema(fields)
+
+
+@contextmanager
+def atomic_path(path: str) -> ContextManager[str]:
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@contextmanager
+def open_compressed(path: str, compression: Optional[str] = None) -> ContextManager[IO[bytes]]:
+    with open(path, 'wb', buffering=WRITE_BUFFER_SIZE) as raw_file:
+        if compression is None:
+            yield raw_file
+        elif compression == 'gzip':
+            with gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6, mtime=0) as compressed_file:
+                yield compressed_file
+        elif compression == 'zstd':
+            import zstandard
+
+            with zstandard.ZstdCompressor().stream_writer(raw_file, closefd=False) as compressed_file:
+                yield compressed_file
+        else:
+            raise ValueError(f'Unknown compression {compression}, expected one of: gzip, zstd')
+
+
+class StagingFormat:
+    name: str
+    extension: str
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        raise NotImplementedError
+
+    def write_records(self, records: List[Dict], path: str) -> None:
+        self.write(pd.DataFrame(records), path)
+
+    def read(self, path: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def iter_chunks(self, path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        df = self.read(path)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+class JsonFormat(StagingFormat):
+    name = 'json'
+    extension = '.json'
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_json(path, orient='records', index=False, force_ascii=False, indent=2)
+
+    def read(self, path: str) -> pd.DataFrame:
+        return pd.read_json(path, orient='records', convert_dates=['date'], keep_default_dates=False)
+
+
+class NdjsonFormat(StagingFormat):
+    def __init__(self, compression: Optional[str] = None) -> None:
+        self.compression = compression
+        self.name = 'ndjson' if compression is None else f'ndjson-{compression}'
+        self.extension = '.ndjson' + COMPRESSIONS[compression]
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_json(path, orient='records', lines=True, index=False, force_ascii=False,
+                   compression=self.compression)
+
+    def write_records(self, records: List[Dict], path: str) -> None:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        with open_compressed(path, self.compression) as binary_file:
+            for record in records:
+                binary_file.write(encoder.encode(record).encode('utf-8') + b'\n')
+
+    def read(self, path: str) -> pd.DataFrame:
+        return pd.read_json(path, orient='records', lines=True, convert_dates=['date'], keep_default_dates=False)
+
+    def iter_chunks(self, path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        with pd.read_json(path, orient='records', lines=True, chunksize=chunk_size, convert_dates=['date'],
+                          keep_default_dates=False) as reader:
+            yield from reader
+
+
+class ParquetFormat(StagingFormat):
+    name = 'parquet'
+    extension = '.parquet'
+
+    def __init__(self, compression: str = 'zstd') -> None:
+        self.compression = compression
+        self.schema = statistics_schema()
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        unknown = [col for col in df.columns if col not in self.schema.names]
+        if unknown:
+            logger.debug(f'Dropping columns missing from the statistics schema: {unknown}')
+
+        df = df.reindex(columns=self.schema.names)
+        df['date'] = pd.to_datetime(df['date']).dt.date
+        df, schema = coerce_statistics(df, self.schema)
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False).replace_schema_metadata()
+        pq.write_table(table, path, compression=self.compression, row_group_size=CHUNK_SIZE)
+
+    def read(self, path: str) -> pd.DataFrame:
+        return pq.read_table(path, memory_map=True).to_pandas()
+
+    def iter_chunks(self, path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+FORMATS: Dict[str, StagingFormat] = {
+    staging_format.name: staging_format for staging_format in (
+        JsonFormat(), NdjsonFormat(), NdjsonFormat('gzip'), NdjsonFormat('zstd'), ParquetFormat()
+    )
+}
+
+
+def get_format(name: str) -> StagingFormat:
+    if name not in FORMATS:
+        raise ValueError(f'Unknown staging format {name}, expected one of: {", ".join(FORMATS)}')
+    return FORMATS[name]
+
+
+def format_for(path: str) -> StagingFormat:
+    for staging_format in sorted(FORMATS.values(), key=lambda staging_format: -len(staging_format.extension)):
+        if path.endswith(staging_format.extension):
+            return staging_format
+    raise ValueError(f'Unknown staging format for {path}')
+
+
+def write_statistics(df: pd.DataFrame, path: str) -> None:
+    with atomic_path(path) as tmp_path:
+        format_for(path).write(df, tmp_path)
+
+
+def write_statistics_records(records: List[Dict], path: str) -> None:
+    with atomic_path(path) as tmp_path:
+        format_for(path).write_records(records, tmp_path)
+
+
+def normalize_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def read_statistics(path: str) -> pd.DataFrame:
+    with stage('dataset.read', bytes=os.path.getsize(path)) as timer:
+        df = normalize_statistics(format_for(path).read(path))
+        timer.rows = len(df)
+    return df
+
+
+def iter_statistics(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    chunks = format_for(path).iter_chunks(path, chunk_size)
+    while True:
+        with stage('dataset.read') as timer:
+            df = next(chunks, None)
+            if df is not None:
+                df = normalize_statistics(df.copy())
+                timer.rows = len(df)
+        if df is None:
+            return
+        yield df
@@ -0,0 +1,159 @@
+import logging
+from typing import Dict, List
+
+import pandas as pd
+from sqlalchemy import Column, Index, MetaData, Table, delete, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+from src.config import STORAGE_LAYOUTS
+from src.models import Base, Performance, schema
+from src.upsert import BATCH_SIZE, KEY_CHUNK_SIZE, UpsertResult, to_records, upsert
+
+logger = logging.getLogger(__name__)
+
+SPARSE_GROUPS = ('carousel', 'ad_offers', 'playable', 'moat', 'social_network', 'romi')
+
+narrow_metadata = MetaData(schema=schema)
+
+
+def check_layout(layout: str) -> str:
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f'Unknown storage layout {layout}, expected one of: {", ".join(STORAGE_LAYOUTS)}')
+    return layout
+
+
+def group_columns(group: str) -> List[str]:
+    return [column for column in Performance.__table__.columns.keys() if column.startswith(f'{group}_')]
+
+
+def copy_column(column: Column, **kwargs) -> Column:
+    return Column(column.name, column.type, **kwargs)
+
+
+def side_table_name(group: str) -> str:
+    return Performance.__tablename__ + ''.join(part.capitalize() for part in group.split('_'))
+
+
+def composite_indexes(table: Table) -> List[Index]:
+    return [index for index in table.indexes if len(index.columns) > 1]
+
+
+def copy_index(index: Index, table_name: str) -> Index:
+    return Index(index.name.replace(Performance.__tablename__, table_name, 1), *index.columns.keys(),
+                 mssql_include=index.dialect_options['mssql']['include'])
+
+
+sparse_columns = {column for group in SPARSE_GROUPS for column in group_columns(group)}
+
+PerformanceCore = Table(
+    f'{Performance.__tablename__}Core', narrow_metadata,
+    *[copy_column(column, primary_key=column.primary_key, index=column.index)
+      for column in Performance.__table__.columns if column.name not in sparse_columns],
+    *[copy_index(index, f'{Performance.__tablename__}Core') for index in composite_indexes(Performance.__table__)]
+)
+
+SIDE_TABLES: Dict[str, Table] = {
+    group: Table(
+        side_table_name(group), narrow_metadata,
+        copy_column(Performance.__table__.c.performance_id, primary_key=True),
+        *[copy_column(Performance.__table__.c[column]) for column in group_columns(group)]
+    )
+    for group in SPARSE_GROUPS
+}
+
+
+def wide_view_query():
+    sources = {column: PerformanceCore for column in PerformanceCore.columns.keys()}
+    joined = PerformanceCore
+    for table in SIDE_TABLES.values():
+        sources.update({column: table for column in table.columns.keys() if column != 'performance_id'})
+        joined = joined.outerjoin(table, table.c.performance_id == PerformanceCore.c.performance_id)
+
+    columns = [sources[column].c[column] for column in Performance.__table__.columns.keys()]
+    return select(*columns).select_from(joined)
+
+
+def ensure_columns(engine: Engine, table: Table) -> List[str]:
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name, schema=schema)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return []
+
+    name = engine.dialect.identifier_preparer.format_table(table)
+    with engine.begin() as connection:
+        for column in missing:
+            connection.execute(text(f'ALTER TABLE {name} ADD {CreateColumn(column).compile(dialect=engine.dialect)}'))
+    logger.info(f'Added columns {", ".join(column.name for column in missing)} to {table.name}')
+    return [column.name for column in missing]
+
+
+def create_narrow_storage(engine: Engine) -> None:
+    narrow_metadata.create_all(engine)
+    added = ensure_columns(engine, PerformanceCore)
+
+    view = engine.dialect.identifier_preparer.format_table(Performance.__table__)
+    inspector = inspect(engine)
+    if Performance.__tablename__ in inspector.get_view_names(schema=schema):
+        if not added:
+            return
+        with engine.begin() as connection:
+            connection.execute(text(f'DROP VIEW {view}'))
+    elif Performance.__tablename__ in inspector.get_table_names(schema=schema):
+        raise RuntimeError(f'{Performance.__tablename__} is a table, move its rows into '
+                           f'{PerformanceCore.name} and the side tables before switching to the narrow layout')
+
+    query = wide_view_query().compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+    with engine.begin() as connection:
+        connection.execute(text(f'CREATE VIEW {view} AS {query}'))
+    logger.info(f'Created {Performance.__tablename__} view over {PerformanceCore.name} and '
+                f'{len(SIDE_TABLES)} side tables')
+
+
+def ensure_indexes(engine: Engine, table: Table) -> None:
+    for index in composite_indexes(table):
+        index.create(engine, checkfirst=True)
+
+
+def create_tables(engine: Engine, layout: str = 'wide') -> None:
+    if check_layout(layout) == 'wide':
+        Base.metadata.create_all(engine)
+        ensure_columns(engine, Performance.__table__)
+        ensure_indexes(engine, Performance.__table__)
+        return
+
+    tables = [table for table in Base.metadata.sorted_tables if table is not Performance.__table__]
+    Base.metadata.create_all(engine, tables=tables)
+    create_narrow_storage(engine)
+    ensure_indexes(engine, PerformanceCore)
+
+
+def delete_side_rows(connection: Connection, table: Table, performance_ids: List[str]) -> None:
+    for start in range(0, len(performance_ids), KEY_CHUNK_SIZE):
+        chunk = performance_ids[start:start + KEY_CHUNK_SIZE]
+        connection.execute(delete(table).where(table.c.performance_id.in_(chunk)))
+
+
+def write_narrow(connection: Connection, df: pd.DataFrame, batch_size: int = BATCH_SIZE) -> UpsertResult:
+    core_columns = [column for column in PerformanceCore.columns.keys() if column in df.columns]
+    result = upsert(connection, PerformanceCore, to_records(df[core_columns]), batch_size=batch_size)
+
+    for table in SIDE_TABLES.values():
+        columns = [column for column in table.columns.keys() if column in df.columns]
+        present = df[columns[1:]].notna().any(axis=1)
+        upsert(connection, table, to_records(df.loc[present, columns]), batch_size=batch_size)
+        if result.updated:
+            delete_side_rows(connection, table, df.loc[~present, 'performance_id'].tolist())
+
+    return UpsertResult(Performance.__tablename__, result.inserted, result.updated)
+
+
+def performance_table(layout: str = 'wide') -> Table:
+    return PerformanceCore if check_layout(layout) == 'narrow' else Performance.__table__
+
+
+def write_performance(connection: Connection, df: pd.DataFrame, batch_size: int = BATCH_SIZE,
+                      layout: str = 'wide') -> UpsertResult:
+    if check_layout(layout) == 'narrow':
+        return write_narrow(connection, df, batch_size)
+    return upsert(connection, Performance.__table__, to_records(df), batch_size=batch_size)
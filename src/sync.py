@@ -0,0 +1,101 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from sqlalchemy import String, select
+from sqlalchemy.engine import Connection, Engine
+
+from src.models import Base, Performance, SyncState
+from src.report import DateWindow
+from src.storage import performance_table, write_performance
+from src.upsert import KEY_CHUNK_SIZE, UpsertResult, stage_table, to_records, upsert
+
+logger = logging.getLogger(__name__)
+
+SETTLEMENT_LAG_DAYS = 3
+KEY_COLUMNS = ['performance_id', 'campaign_id', 'ad_group_id', 'banner_id', 'date', 'fingerprint']
+FINGERPRINT_DECIMALS = 6
+METRIC_COLUMNS = sorted(col for col in Performance.__table__.columns.keys() if col not in KEY_COLUMNS)
+
+
+def sync_window(last_synced_date: date, today: date, settlement_lag: int = SETTLEMENT_LAG_DAYS) -> DateWindow:
+    start = min(last_synced_date + timedelta(days=1), today - timedelta(days=settlement_lag))
+    return DateWindow(start, today)
+
+
+def sync_windows(engine: Engine, today: date, settlement_lag: int = SETTLEMENT_LAG_DAYS) -> Dict[int, DateWindow]:
+    Base.metadata.create_all(engine, tables=[SyncState.__table__])
+    with engine.connect() as connection:
+        watermarks = connection.execute(select(SyncState.banner_id, SyncState.last_synced_date)).all()
+
+    windows = {
+        banner_id: sync_window(last_synced_date, today, settlement_lag)
+        for banner_id, last_synced_date in watermarks if last_synced_date is not None
+    }
+    logger.info(f'Loaded sync watermarks for {len(windows)} banners with {settlement_lag} days settlement lag')
+    return windows
+
+
+def fingerprints(df: pd.DataFrame) -> pd.Series:
+    metrics = df.reindex(columns=METRIC_COLUMNS)
+    for column in METRIC_COLUMNS:
+        values = metrics[column]
+        if isinstance(Performance.__table__.c[column].type, String):
+            metrics[column] = values.astype(object).where(values.notna(), None)
+        else:
+            metrics[column] = pd.to_numeric(values, errors='coerce').astype('float64').round(FINGERPRINT_DECIMALS)
+    hashes = pd.util.hash_pandas_object(metrics, index=False)
+    return pd.Series(hashes.to_numpy().astype('int64'), index=df.index)
+
+
+def stored_fingerprints(connection: Connection, performance_ids: List[str], layout: str = 'wide') -> pd.Series:
+    table = performance_table(layout)
+    query = select(table.c.performance_id, table.c.fingerprint)
+    stored = {}
+    if not performance_ids:
+        return pd.Series(stored, dtype='Int64')
+    if connection.dialect.name == 'mssql':
+        with stage_table(connection, table, ['performance_id']) as stage:
+            connection.execute(stage.insert(), [{'performance_id': key} for key in set(performance_ids)])
+            stored.update(connection.execute(
+                query.join(stage, stage.c.performance_id == table.c.performance_id)
+            ).all())
+    else:
+        for start in range(0, len(performance_ids), KEY_CHUNK_SIZE):
+            chunk = performance_ids[start:start + KEY_CHUNK_SIZE]
+            stored.update(connection.execute(query.where(table.c.performance_id.in_(chunk))).all())
+    return pd.Series(stored, dtype='Int64')
+
+
+def filter_unchanged(connection: Connection, df: pd.DataFrame, layout: str = 'wide') -> pd.DataFrame:
+    df = df.drop(columns='fingerprint', errors='ignore')
+    df['fingerprint'] = fingerprints(df)
+
+    stored = stored_fingerprints(connection, df['performance_id'].tolist(), layout)
+    previous = stored.reindex(df['performance_id'].to_numpy())
+    changed = previous.ne(df['fingerprint'].to_numpy()).fillna(True).to_numpy(dtype=bool)
+    return df[changed]
+
+
+def save_sync_state(connection: Connection, df: pd.DataFrame) -> None:
+    watermarks = df.groupby('banner_id', as_index=False)['date'].max()
+    watermarks.rename(columns={'date': 'last_synced_date'}, inplace=True)
+    upsert(connection, SyncState.__table__, to_records(watermarks))
+
+
+def write_changed(connection: Connection, df: pd.DataFrame, batch_size: int,
+                  layout: str = 'wide') -> Tuple[pd.DataFrame, UpsertResult]:
+    changed = filter_unchanged(connection, df, layout)
+    result = write_performance(connection, changed, batch_size, layout)
+
+    skipped = len(df) - len(changed)
+    logger.info(f'Skipped {skipped}/{len(df)} unchanged Performance rows.')
+    return changed, result
+
+
+def sync_performance(connection: Connection, df: pd.DataFrame, batch_size: int,
+                     layout: str = 'wide') -> Tuple[pd.DataFrame, UpsertResult]:
+    changed, result = write_changed(connection, df, batch_size, layout)
+    save_sync_state(connection, df)
+    return changed, result
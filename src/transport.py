@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = (10, 120)
+CACHE_TTL = 6 * 60 * 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class TransportMetrics:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.cache_hits: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, endpoint: str, latency: float) -> None:
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.latencies[endpoint].append(latency)
+
+    def record_retry(self, endpoint: str) -> None:
+        with self.lock:
+            self.retries[endpoint] += 1
+
+    def record_cache_hit(self, endpoint: str) -> None:
+        with self.lock:
+            self.cache_hits[endpoint] += 1
+
+    def summary(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        with self.lock:
+            endpoints = set(self.requests) | set(self.cache_hits)
+            return {
+                endpoint: {
+                    'requests': self.requests[endpoint],
+                    'retries': self.retries[endpoint],
+                    'cache_hits': self.cache_hits[endpoint],
+                    'p50': round(percentile(self.latencies[endpoint], 50), 3),
+                    'p90': round(percentile(self.latencies[endpoint], 90), 3),
+                    'p99': round(percentile(self.latencies[endpoint], 99), 3),
+                    'total_seconds': round(sum(self.latencies[endpoint]), 3),
+                }
+                for endpoint in sorted(endpoints)
+            }
+
+    def log(self) -> None:
+        for endpoint, stats in self.summary().items():
+            logger.info(f'{endpoint}: {stats["requests"]} requests, {stats["retries"]} retries, '
+                        f'{stats["cache_hits"]} cache hits, p50={stats["p50"]}s p90={stats["p90"]}s '
+                        f'p99={stats["p99"]}s total={stats["total_seconds"]}s')
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, ttl: float = CACHE_TTL) -> None:
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict], scope: str) -> str:
+        payload = json.dumps([scope, url, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self.path(key), 'r', encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry['stored_at'] < self.ttl
+
+    def put(self, key: str, body: Any, headers: Dict[str, str]) -> None:
+        entry = {
+            'stored_at': time.time(),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body': body
+        }
+        tmp_path = f'{self.path(key)}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(entry, cache_file, ensure_ascii=False)
+        os.replace(tmp_path, self.path(key))
+
+    def touch(self, key: str, entry: Dict) -> None:
+        entry['stored_at'] = time.time()
+        self.put(key, entry['body'], {'ETag': entry.get('etag'), 'Last-Modified': entry.get('last_modified')})
+
+
+class Transport:
+    def __init__(self, headers: Optional[Dict[str, str]] = None, pool_size: int = 10,
+                 timeout: Tuple[float, float] = TIMEOUT, max_retries: int = 5, backoff: float = 1.0,
+                 max_backoff: float = 60.0, rate_limiter: Optional[TokenBucket] = None,
+                 cache: Optional[ResponseCache] = None, metrics: Optional[TransportMetrics] = None) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.metrics = metrics or TransportMetrics()
+        self.cache_scope = hashlib.sha1(json.dumps(headers or {}, sort_keys=True).encode()).hexdigest()
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'Transport':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, url: str, params: Optional[Dict] = None,
+                headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        endpoint = urlparse(url).path
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            started_at = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self.metrics.record(endpoint, time.perf_counter() - started_at)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f'{endpoint}: {exc.__class__.__name__}, retry {attempt + 1}/{self.max_retries} '
+                               f'in {delay:.1f}s')
+            else:
+                self.metrics.record(endpoint, time.perf_counter() - started_at)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    break
+                delay = self.delay(attempt, response)
+                logger.warning(f'{endpoint}: HTTP {response.status_code}, retry {attempt + 1}/{self.max_retries} '
+                               f'in {delay:.1f}s')
+                if response.status_code == 429 and self.rate_limiter is not None:
+                    self.rate_limiter.pause(delay)
+                    delay = 0
+
+            self.metrics.record_retry(endpoint)
+            time.sleep(delay)
+
+        if response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+        return response
+
+    def get_json(self, url: str, params: Optional[Dict] = None, cache: bool = False) -> Any:
+        if not cache or self.cache is None:
+            return self.request(url, params=params).json()
+
+        endpoint = urlparse(url).path
+        key = self.cache.key(url, params, self.cache_scope)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.metrics.record_cache_hit(endpoint)
+            return entry['body']
+
+        headers = {}
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.request(url, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self.metrics.record_cache_hit(endpoint)
+            self.cache.touch(key, entry)
+            return entry['body']
+
+        body = response.json()
+        if response.status_code == 200:
+            self.cache.put(key, body, response.headers)
+        return body
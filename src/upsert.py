@@ -0,0 +1,155 @@
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Sequence, Set
+
+import pandas as pd
+from sqlalchemy import Column, MetaData, Table, bindparam, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10000
+KEY_CHUNK_SIZE = 500
+
+
+@dataclass
+class UpsertResult:
+    table: str
+    inserted: int = 0
+    updated: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.updated
+
+    def __add__(self, other: 'UpsertResult') -> 'UpsertResult':
+        return UpsertResult(self.table, self.inserted + other.inserted, self.updated + other.updated)
+
+    def __str__(self) -> str:
+        return f'{self.table} +{self.inserted}/~{self.updated}'
+
+
+def to_records(df: pd.DataFrame) -> List[Dict]:
+    names = list(df.columns)
+    columns = [df[name].astype(object).where(df[name].notna(), None).tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def batched(records: Sequence[Dict], batch_size: int) -> Iterator[Sequence[Dict]]:
+    for start in range(0, len(records), batch_size):
+        yield records[start:start + batch_size]
+
+
+def primary_key(table: Table) -> Column:
+    columns = list(table.primary_key.columns)
+    if len(columns) != 1:
+        raise ValueError(f'Bulk upsert requires a single-column primary key, {table.name} has {len(columns)}')
+    return columns[0]
+
+
+def existing_keys(connection: Connection, pk: Column, keys: Sequence) -> Set:
+    existing = set()
+    for start in range(0, len(keys), KEY_CHUNK_SIZE):
+        chunk = keys[start:start + KEY_CHUNK_SIZE]
+        existing.update(connection.scalars(select(pk).where(pk.in_(chunk))))
+    return existing
+
+
+def upsert_sqlite(connection: Connection, table: Table, records: Sequence[Dict]) -> UpsertResult:
+    pk = primary_key(table)
+    keys = [record[pk.name] for record in records]
+    existing = existing_keys(connection, pk, keys)
+
+    stmt = sqlite_insert(table)
+    update_columns = [name for name in records[0] if name != pk.name]
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[pk],
+            set_={name: stmt.excluded[name] for name in update_columns}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[pk])
+    connection.execute(stmt, list(records))
+
+    updated = len(existing)
+    return UpsertResult(table.name, inserted=len(set(keys)) - updated, updated=updated)
+
+
+@contextmanager
+def stage_table(connection: Connection, table: Table, columns: Sequence[str]) -> Iterator[Table]:
+    preparer = connection.dialect.identifier_preparer
+    stage_name = f'#stage_{table.name}'
+    stage = Table(stage_name, MetaData(), *[Column(name, table.columns[name].type) for name in columns])
+
+    quoted = ', '.join(preparer.quote(name) for name in columns)
+    connection.execute(text(f'SELECT TOP 0 {quoted} INTO {stage_name} FROM {preparer.format_table(table)}'))
+    try:
+        yield stage
+    finally:
+        connection.execute(text(f'DROP TABLE {stage_name}'))
+
+
+def upsert_mssql(connection: Connection, table: Table, records: Sequence[Dict]) -> UpsertResult:
+    pk = primary_key(table)
+    columns = list(records[0])
+    preparer = connection.dialect.identifier_preparer
+
+    target = preparer.format_table(table)
+    stage_name = f'#stage_{table.name}'
+
+    quoted = [preparer.quote(name) for name in columns]
+    quoted_pk = preparer.quote(pk.name)
+    update_set = ', '.join(f't.{name} = s.{name}' for name in quoted if name != quoted_pk)
+
+    merge = (
+        f'MERGE {target} WITH (HOLDLOCK) AS t '
+        f'USING {stage_name} AS s ON t.{quoted_pk} = s.{quoted_pk} '
+        + (f'WHEN MATCHED THEN UPDATE SET {update_set} ' if update_set else '')
+        + f'WHEN NOT MATCHED THEN INSERT ({", ".join(quoted)}) VALUES ({", ".join(f"s.{name}" for name in quoted)}) '
+        + 'OUTPUT $action;'
+    )
+
+    with stage_table(connection, table, columns) as stage:
+        connection.execute(stage.insert(), list(records))
+        actions = Counter(row[0] for row in connection.execute(text(merge)))
+
+    return UpsertResult(table.name, inserted=actions['INSERT'], updated=actions['UPDATE'])
+
+
+def upsert_generic(connection: Connection, table: Table, records: Sequence[Dict]) -> UpsertResult:
+    pk = primary_key(table)
+    latest = {record[pk.name]: record for record in records}
+    existing = existing_keys(connection, pk, list(latest))
+
+    inserts = [record for key, record in latest.items() if key not in existing]
+    updates = [{**record, '_pk': key} for key, record in latest.items() if key in existing]
+    update_columns = [name for name in records[0] if name != pk.name]
+
+    if inserts:
+        connection.execute(table.insert(), inserts)
+    if updates and update_columns:
+        stmt = table.update().where(pk == bindparam('_pk')).values(
+            {name: bindparam(name) for name in update_columns}
+        )
+        connection.execute(stmt, updates)
+
+    return UpsertResult(table.name, inserted=len(inserts), updated=len(updates))
+
+
+def upsert(connection: Connection, table: Table, records: List[Dict], batch_size: int = BATCH_SIZE) -> UpsertResult:
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        upsert_batch = upsert_sqlite
+    elif dialect == 'mssql':
+        upsert_batch = upsert_mssql
+    else:
+        upsert_batch = upsert_generic
+
+    result = UpsertResult(table.name)
+    for batch in batched(records, batch_size):
+        result += upsert_batch(connection, table, batch)
+        logger.info(f'{table.name}: upserted {result.total}/{len(records)} rows.')
+    return result
@@ -0,0 +1,21 @@
+import os
+import sys
+from os.path import abspath, dirname
+
+os.environ['PROD'] = '0'
+os.environ.pop('STORAGE_LAYOUT', None)
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+import pytest
+from sqlalchemy.engine import Engine
+
+from src.db import get_engine
+from src.storage import create_tables
+
+
+@pytest.fixture
+def engine(tmp_path) -> Engine:
+    engine = get_engine(f'sqlite:///{tmp_path / "mytarget.db"}', '')
+    create_tables(engine)
+    yield engine
+    engine.dispose()
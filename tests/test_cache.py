@@ -0,0 +1,51 @@
+import pandas as pd
+
+from src.cache import DimensionCache
+from src.db import get_engine
+from src.models import Campaign
+from src.storage import create_tables
+from src.upsert import upsert
+
+CAMPAIGNS = Campaign.__table__
+FRAME = pd.DataFrame({'campaign_id': [1, 2], 'campaign_name': ['first', 'second']})
+
+
+def database(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    engine = get_engine(f'sqlite:///{path}', '')
+    create_tables(engine)
+    return engine
+
+
+def test_warm_prefers_database_over_snapshot(tmp_path):
+    snapshot = str(tmp_path / 'cache' / 'dimensions.json')
+    engine = database(tmp_path / 'a.db')
+    with engine.begin() as connection:
+        upsert(connection, CAMPAIGNS, FRAME.to_dict('records'))
+
+    cache = DimensionCache(snapshot_path=snapshot)
+    cache.warm(engine)
+    assert cache.changed(CAMPAIGNS, FRAME).empty
+
+    with engine.begin() as connection:
+        connection.execute(CAMPAIGNS.delete())
+    cache = DimensionCache(snapshot_path=snapshot)
+    cache.warm(engine)
+    assert len(cache.changed(CAMPAIGNS, FRAME)) == 2
+
+
+def test_snapshot_is_a_fallback_for_the_same_database_only(tmp_path):
+    snapshot = str(tmp_path / 'cache' / 'dimensions.json')
+    engine = database(tmp_path / 'prod' / 'a.db')
+    with engine.begin() as connection:
+        upsert(connection, CAMPAIGNS, FRAME.to_dict('records'))
+    DimensionCache(snapshot_path=snapshot).warm(engine)
+
+    (tmp_path / 'prod').rename(tmp_path / 'moved')
+    cache = DimensionCache(snapshot_path=snapshot)
+    cache.warm(get_engine(f'sqlite:///{tmp_path / "prod" / "a.db"}', ''))
+    assert cache.changed(CAMPAIGNS, FRAME).empty
+
+    cache = DimensionCache(snapshot_path=snapshot)
+    cache.warm(get_engine(f'sqlite:///{tmp_path / "test" / "a.db"}', ''))
+    assert len(cache.changed(CAMPAIGNS, FRAME)) == 2
@@ -0,0 +1,69 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from bench.fake_api import FakeMyTargetAPI
+from bench.generator import Scale
+from src.cli import parse_args
+from src.config import Config
+from src.models import CampaignDaily, Performance
+
+SCALE = Scale(campaigns=2, banners=3, days=3)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    with FakeMyTargetAPI(SCALE) as api:
+        monkeypatch.setenv('MYTARGET_BASE_URL', api.base_url)
+        monkeypatch.setenv('ACCESS_TOKENS', 'token')
+        monkeypatch.setenv('CONCURRENCY', '2')
+        monkeypatch.setenv('LOG_LEVEL', 'INFO')
+        monkeypatch.delenv('TG_TOKEN', raising=False)
+        yield Config.from_env(str(tmp_path))
+
+
+def run(config: Config, *argv: str) -> int:
+    args = parse_args(list(argv))
+    return args.func(config, args)
+
+
+def performance_rows(config: Config) -> int:
+    engine = create_engine(config.connection_url)
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.count()).select_from(Performance.__table__))
+    finally:
+        engine.dispose()
+
+
+def test_download_then_load(config):
+    assert run(config, 'download') == 0
+    assert run(config, 'load', '--chunk-size', '2') == 0
+    assert performance_rows(config) == SCALE.rows
+    assert run(config, 'load') == 0
+
+
+def test_sync_then_rebuild_rollups(config):
+    assert run(config, 'sync') == 0
+    assert performance_rows(config) == SCALE.rows
+    assert run(config, 'rebuild-rollups') == 0
+
+    engine = create_engine(config.connection_url)
+    with engine.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(CampaignDaily.__table__)) > 0
+    engine.dispose()
+
+
+def test_backfill_skips_completed_shards(config):
+    assert run(config, 'backfill', '2024-01-01', '2024-01-03', '--days', '2') == 0
+    manifest_path = config.manifest_path(f'{config.project_root}/statistics/backfill/2024-01-01_2024-01-03')
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        assert set(json.load(manifest_file)['shards']) == {'2024-01-01_2024-01-02', '2024-01-03_2024-01-03'}
+    assert run(config, 'backfill', '2024-01-01', '2024-01-03', '--days', '2') == 0
+
+
+def test_status(config, capsys):
+    assert run(config, 'status', '--date', str(date(2024, 1, 1))) == 0
+    assert json.loads(capsys.readouterr().out)['date'] == '2024-01-01'
@@ -0,0 +1,35 @@
+from sqlalchemy import func, select
+
+from bench.generator import Scale, generate_statistics
+from src import db
+from src.manifest import RunManifest
+from src.models import Performance
+
+SCALE = Scale(campaigns=2, banners=2, days=3)
+
+
+def test_chunked_load_folder_shares_one_engine(tmp_path, monkeypatch):
+    folder = tmp_path / 'statistics'
+    files = generate_statistics(str(folder), SCALE)
+    url = f'sqlite:///{tmp_path / "mytarget.db"}'
+
+    engines = []
+    create = db.create_db_engine
+
+    def create_db_engine(connection_url, **kwargs):
+        engine = create(connection_url, **kwargs)
+        engines.append(engine)
+        return engine
+
+    monkeypatch.setattr(db, 'create_db_engine', create_db_engine)
+    manifest = RunManifest(str(tmp_path / 'statistics.manifest.json'))
+
+    messages = db.load_folder(str(folder), url, '', manifest=manifest, chunk_size=2)
+    assert len(engines) == 1
+    assert messages[-1].startswith(f'{len(files)} files, {SCALE.rows} rows.')
+    assert all(manifest.loaded(file) for file in files)
+    with engines[0].connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(Performance.__table__)) == SCALE.rows
+
+    messages = db.load_folder(str(folder), url, '', manifest=manifest, chunk_size=2)
+    assert sum(message.endswith('already loaded.') for message in messages) == len(files)
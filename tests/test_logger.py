@@ -0,0 +1,88 @@
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from logging.handlers import QueueHandler
+
+import pytest
+
+from src.config import Config
+from src.logger import LOG_QUEUE, flush_logger, setup_logger, stop_logger, worker_logging
+
+
+@pytest.fixture
+def json_log(tmp_path):
+    logger_file = setup_logger(datetime(2024, 1, 1), str(tmp_path), log_format='json', level=logging.INFO)
+    yield logger_file
+    stop_logger()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def read_entries(path: str):
+    flush_logger()
+    with open(path, 'r', encoding='utf-8') as log_file:
+        return [json.loads(line) for line in log_file]
+
+
+def test_json_log_keeps_exception_and_fields(json_log):
+    log = logging.getLogger('tests')
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        log.exception('failed %s', 'loading')
+    log.info('stage done', extra={'stage': 'db.upsert', 'duration': 0.5})
+    logging.getLogger('sqlalchemy.engine').info('SELECT 1')
+
+    failed, done = read_entries(json_log)
+    assert failed['message'] == 'failed loading'
+    assert 'ValueError: boom' in failed['exception']
+    assert done['stage'] == 'db.upsert' and done['duration'] == 0.5
+    assert done['monotonic'] >= failed['monotonic']
+
+
+def log_from_worker(value: int) -> int:
+    log = logging.getLogger('src.parallel')
+    log.warning('partition %s', value, extra={'rows': value})
+    try:
+        raise ValueError('worker boom')
+    except ValueError:
+        log.exception('partition failed')
+    log.debug('hidden')
+    return value
+
+
+def test_worker_records_reach_the_log(json_log):
+    context = multiprocessing.get_context('spawn')
+    with worker_logging(context) as (initializer, initargs):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=initializer,
+                                 initargs=initargs) as executor:
+            assert executor.submit(log_from_worker, 7).result() == 7
+
+    warning, failed = read_entries(json_log)
+    assert (warning['message'], warning['rows'], warning['logger']) == ('partition 7', 7, 'src.parallel')
+    assert 'ValueError: worker boom' in failed['exception']
+
+
+def test_stop_logger_detaches_queue_handler(tmp_path):
+    setup_logger(datetime(2024, 1, 1), str(tmp_path), level=logging.INFO)
+    stop_logger()
+    logging.getLogger('tests').warning('after stop')
+    assert not any(isinstance(handler, QueueHandler) for handler in logging.getLogger().handlers)
+    assert LOG_QUEUE.empty()
+
+
+def test_config_rejects_unknown_log_level(monkeypatch):
+    monkeypatch.setenv('LOG_LEVEL', 'LOUD')
+    with pytest.raises(ValueError, match='LOG_LEVEL'):
+        Config.from_env()
+
+
+def test_config_normalizes_log_settings(monkeypatch):
+    monkeypatch.setenv('LOG_LEVEL', 'info')
+    monkeypatch.setenv('LOG_FORMAT', 'JSON')
+    monkeypatch.delenv('LOG_ROTATION', raising=False)
+    config = Config.from_env()
+    assert (config.log_level, config.log_format, config.log_rotation) == (logging.INFO, 'json', None)
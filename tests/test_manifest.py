@@ -0,0 +1,48 @@
+from src.manifest import RunManifest
+
+
+def write(path, content: str) -> str:
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+def test_manifest_resumes_downloads_loads_and_shards(tmp_path):
+    statistics = write(tmp_path / '1_2_3.ndjson', '{"date": "2024-01-01"}\n')
+    manifest_path = str(tmp_path / 'manifest' / 'run.json')
+
+    manifest = RunManifest(manifest_path)
+    manifest.record_download(3, statistics, 1)
+    manifest.record_loads([statistics], [1])
+    manifest.record_shard('2024-01-01_2024-01-07', '2024-01-01', '2024-01-07')
+
+    resumed = RunManifest(manifest_path)
+    assert resumed.downloaded(3, statistics)
+    assert resumed.loaded(statistics)
+    assert resumed.completed('2024-01-01_2024-01-07')
+    assert not resumed.completed('2024-01-08_2024-01-14')
+    assert not resumed.downloaded(4, statistics)
+
+
+def test_manifest_rejects_changed_or_missing_files(tmp_path):
+    statistics = write(tmp_path / '1_2_3.ndjson', '{"date": "2024-01-01"}\n')
+    manifest_path = str(tmp_path / 'run.json')
+
+    manifest = RunManifest(manifest_path)
+    manifest.record_download(3, statistics, 1)
+    manifest.record_loads([statistics], [1])
+
+    write(tmp_path / '1_2_3.ndjson', '{"date": "2024-01-02"}\n')
+    resumed = RunManifest(manifest_path)
+    assert not resumed.downloaded(3, statistics)
+    assert not resumed.loaded(statistics)
+
+    (tmp_path / '1_2_3.ndjson').unlink()
+    assert not resumed.loaded(statistics)
+
+
+def test_manifest_without_path_keeps_state_in_memory(tmp_path):
+    statistics = write(tmp_path / '1_2_3.ndjson', '{}\n')
+    manifest = RunManifest()
+    manifest.record_loads([statistics], [1])
+    assert manifest.loaded(statistics)
+    assert list(tmp_path.iterdir()) == [tmp_path / '1_2_3.ndjson']
@@ -0,0 +1,28 @@
+from src.report import MyTargetAPI
+
+
+class PagedSession:
+    def __init__(self, total: int, count: bool) -> None:
+        self.total = total
+        self.count = count
+        self.calls = []
+
+    def get_json(self, url, params=None, cache=False):
+        offset = params['offset']
+        self.calls.append(offset)
+        items = [{'id': index} for index in range(offset, min(self.total, offset + params['limit']))]
+        return {'items': items, 'count': self.total} if self.count else {'items': items}
+
+
+def test_paginated_reads_every_page_without_count():
+    session = PagedSession(total=25, count=False)
+    items = list(MyTargetAPI('token').get_paginated(session, 'url', limit=10))
+    assert [item['id'] for item in items] == list(range(25))
+    assert session.calls == [0, 10, 20]
+
+
+def test_paginated_stops_at_count():
+    session = PagedSession(total=20, count=True)
+    items = list(MyTargetAPI('token').get_paginated(session, 'url', limit=10))
+    assert len(items) == 20
+    assert session.calls == [0, 10]
@@ -0,0 +1,39 @@
+from datetime import date
+
+from sqlalchemy import insert
+
+from src.models import Performance
+from src.query import invalidate_results, mark_loaded, spend_by_campaign
+
+DAY = date(2024, 1, 1)
+
+
+def add_row(engine, performance_id: str, shows: int, spent: float, marker: bool = True) -> None:
+    with engine.begin() as connection:
+        connection.execute(insert(Performance.__table__), [{
+            'performance_id': performance_id, 'campaign_id': 1, 'ad_group_id': 1, 'banner_id': 1, 'date': DAY,
+            'base_shows': shows, 'base_clicks': 1, 'base_spent': spent
+        }])
+        if marker:
+            mark_loaded(connection)
+
+
+def test_sums_do_not_overflow_int32(engine):
+    invalidate_results()
+    add_row(engine, 'a', 2 ** 31 - 1, 1.0)
+    add_row(engine, 'b', 2 ** 31 - 1, 1.0)
+    df = spend_by_campaign(engine, DAY, DAY, use_cache=False)
+    assert int(df.loc[0, 'shows']) == 2 * (2 ** 31 - 1)
+
+
+def test_cache_is_keyed_on_load_marker(engine):
+    invalidate_results()
+    add_row(engine, 'a', 10, 5.0)
+    assert spend_by_campaign(engine, DAY, DAY).loc[0, 'spent'] == 5.0
+
+    add_row(engine, 'b', 10, 5.0, marker=False)
+    assert spend_by_campaign(engine, DAY, DAY).loc[0, 'spent'] == 5.0
+
+    with engine.begin() as connection:
+        mark_loaded(connection)
+    assert spend_by_campaign(engine, DAY, DAY).loc[0, 'spent'] == 10.0
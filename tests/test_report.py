@@ -0,0 +1,58 @@
+from datetime import date
+from typing import Optional
+
+import pytest
+import requests
+
+from src.report import DateWindow, MyTargetAPI
+
+WINDOW = DateWindow(date(2024, 1, 1), date(2024, 1, 3))
+
+
+class StatisticsSession:
+    def __init__(self, error: Optional[Exception] = None, max_ids: int = 100) -> None:
+        self.error = error
+        self.max_ids = max_ids
+        self.calls = 0
+
+    def get_json(self, url, params=None, cache=False):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        ids = [int(banner_id) for banner_id in params['id'].split(',')]
+        if len(ids) > self.max_ids:
+            return {'error': 'too many banners'}
+        return {'items': [{'id': banner_id, 'rows': [{'date': '2024-01-01'}]} for banner_id in ids]}
+
+
+def test_shards_cover_range_without_gaps():
+    shards = DateWindow(date(2024, 1, 1), date(2024, 1, 20)).shards(7)
+    assert shards == [
+        DateWindow(date(2024, 1, 1), date(2024, 1, 7)),
+        DateWindow(date(2024, 1, 8), date(2024, 1, 14)),
+        DateWindow(date(2024, 1, 15), date(2024, 1, 20)),
+    ]
+
+
+def test_shards_of_single_day():
+    window = DateWindow(date(2024, 1, 1), date(2024, 1, 1))
+    assert window.shards(7) == [window]
+
+
+def test_shards_reject_non_positive_size():
+    with pytest.raises(ValueError):
+        DateWindow(date(2024, 1, 1), date(2024, 1, 2)).shards(0)
+
+
+def test_statistics_batch_splits_on_error_payload():
+    session = StatisticsSession(max_ids=2)
+    rows = MyTargetAPI('token').get_statistics_batch(session, list(range(4)), WINDOW)
+    assert sorted(rows) == [0, 1, 2, 3]
+    assert session.calls == 3 + 2
+
+
+def test_statistics_batch_does_not_split_transport_failures():
+    session = StatisticsSession(error=requests.ConnectionError('down'))
+    with pytest.raises(requests.ConnectionError):
+        MyTargetAPI('token').get_statistics_batch(session, list(range(16)), WINDOW)
+    assert session.calls == 1
@@ -0,0 +1,59 @@
+from datetime import date
+from typing import Dict, List
+
+import pytest
+
+from src.hierarchy import AccountHierarchy
+from src.manifest import RunManifest
+from src.report import DateWindow, MyTargetAPI
+from src.scheduler import Partition, Scheduler
+
+
+def fake_hierarchy(api: MyTargetAPI, session) -> AccountHierarchy:
+    if api.access_token == 'broken':
+        raise RuntimeError('hierarchy unavailable')
+
+    hierarchy = AccountHierarchy()
+    hierarchy.add_campaign(1, 'Campaign 1')
+    for banner_id in (10, 11):
+        hierarchy.add_banner(1, 100, banner_id)
+    return hierarchy
+
+
+def fake_statistics(api: MyTargetAPI, session, banner_ids: List[int], window: DateWindow) -> Dict[int, List[Dict]]:
+    return {banner_id: [{'date': window.start.isoformat(), 'base': {'shows': 10, 'clicks': 1, 'spent': 2.5}}]
+            for banner_id in banner_ids}
+
+
+@pytest.fixture(autouse=True)
+def fake_api(monkeypatch):
+    monkeypatch.setattr(AccountHierarchy, 'fetch', classmethod(lambda cls, api, session: fake_hierarchy(api, session)))
+    monkeypatch.setattr(MyTargetAPI, 'get_statistics_batch', fake_statistics)
+
+
+def partitions(tmp_path) -> List[Partition]:
+    shards = DateWindow(date(2024, 1, 1), date(2024, 1, 14)).shards(7)
+    result = []
+    for shard in shards:
+        folder = tmp_path / f'{shard.start}_{shard.end}'
+        folder.mkdir()
+        result.append(Partition(f'{shard.start}_{shard.end}', shard,
+                                str(folder / '{campaign_id}_{ad_group_id}_{banner_id}.ndjson'),
+                                RunManifest(f'{folder}.manifest.json')))
+    return result
+
+
+def run(tmp_path, engine, access_tokens: List[str]) -> List[str]:
+    completed = []
+    scheduler = Scheduler(access_tokens, '', None, engine, workers=2, partitions=partitions(tmp_path),
+                          on_partition_complete=lambda partition: completed.append(partition.name))
+    scheduler.run()
+    return completed
+
+
+def test_partitions_complete_once_loaded(tmp_path, engine):
+    assert sorted(run(tmp_path, engine, ['a', 'b'])) == ['2024-01-01_2024-01-07', '2024-01-08_2024-01-14']
+
+
+def test_failed_planning_blocks_completion(tmp_path, engine):
+    assert run(tmp_path, engine, ['broken', 'b']) == []
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from bench.generator import Scale, statistics_frame
+from src.staging import coerce_statistics, read_statistics, write_statistics
+
+
+def test_parquet_accepts_fractional_integers_and_numeric_strings(tmp_path):
+    df = statistics_frame(Scale(days=4), 1000, 100000, 10000000, np.random.default_rng(0))
+    df.loc[0, 'uniques_video_viewed_25_percent'] = 12.5
+    df.loc[0, 'video_viewed_range_rate'] = 0.5
+    path = str(tmp_path / 'statistics.parquet')
+
+    write_statistics(df, path)
+    stored = read_statistics(path)
+
+    assert len(stored) == 4
+    assert stored.loc[0, 'uniques_video_viewed_25_percent'] == 12.5
+    assert stored.loc[0, 'video_viewed_range_rate'] == '0.5'
+
+
+def test_coerce_keeps_integral_values_as_integers():
+    schema = pa.schema([pa.field('shows', pa.int64()), pa.field('ratio', pa.int64()), pa.field('range', pa.string())])
+    df = pd.DataFrame({'shows': ['1', 2.0, None], 'ratio': [1, 1.5, None], 'range': ['10-25', 0.5, None]})
+
+    df, coerced = coerce_statistics(df, schema)
+
+    assert coerced.field('shows').type == pa.int64()
+    assert coerced.field('ratio').type == pa.float64()
+    assert df['shows'].tolist()[:2] == [1, 2]
+    assert df['range'].tolist()[:2] == ['10-25', '0.5']
+    assert df['range'].isna().iloc[2]
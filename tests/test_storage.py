@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import func, select
+
+from src.config import Config
+from src.db import get_engine
+from src.models import Performance
+from src.storage import PerformanceCore, create_tables
+from src.sync import filter_unchanged, write_changed
+from test_sync import performance_frame
+
+
+def test_narrow_layout_round_trip(tmp_path):
+    engine = get_engine(f'sqlite:///{tmp_path / "narrow.db"}', '')
+    create_tables(engine, 'narrow')
+    df = performance_frame()
+
+    with engine.begin() as connection:
+        changed, result = write_changed(connection, df, batch_size=100, layout='narrow')
+        assert result.inserted == len(df)
+    with engine.begin() as connection:
+        assert filter_unchanged(connection, df, layout='narrow').empty
+        assert connection.scalar(select(func.count()).select_from(PerformanceCore)) == len(df)
+        assert connection.scalar(select(func.count()).select_from(Performance.__table__)) == len(df)
+    engine.dispose()
+
+
+def test_unknown_layout_is_rejected(engine, monkeypatch):
+    with pytest.raises(ValueError, match='storage layout'):
+        create_tables(engine, 'tall')
+
+    monkeypatch.setenv('STORAGE_LAYOUT', 'tall')
+    with pytest.raises(ValueError, match='STORAGE_LAYOUT'):
+        Config.from_env()
+
+
+def test_config_resolves_layout(monkeypatch):
+    monkeypatch.setenv('STORAGE_LAYOUT', 'Narrow')
+    assert Config.from_env().storage_layout == 'narrow'
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+from src.db import Dataset
+from src.models import Performance
+from src.sync import filter_unchanged, sync_window, write_changed
+
+
+def performance_frame() -> pd.DataFrame:
+    statistics = pd.DataFrame({
+        'campaign_id': [1, 1, 1],
+        'campaign_name': ['Campaign 1'] * 3,
+        'ad_group_id': [100, 100, 100],
+        'banner_id': [10, 10, 11],
+        'date': ['2024-01-01', '2024-01-02', '2024-01-01'],
+        'base_shows': [100, 200, 300],
+        'base_clicks': [1, 2, 3],
+        'base_spent': [1.25, 2.5, 3.75],
+        'video_viewed_range_rate': ['10-25', 0.5, None],
+    })
+    return Dataset(statistics).frame(Performance.__table__)
+
+
+def test_filter_unchanged_skips_stored_rows(engine):
+    df = performance_frame()
+    with engine.begin() as connection:
+        assert len(filter_unchanged(connection, df)) == 3
+        changed, result = write_changed(connection, df, batch_size=2)
+        assert len(changed) == 3 and result.inserted == 3
+
+    with engine.begin() as connection:
+        assert filter_unchanged(connection, df).empty
+
+
+def test_filter_unchanged_returns_modified_rows(engine):
+    df = performance_frame()
+    with engine.begin() as connection:
+        write_changed(connection, df, batch_size=100)
+
+    df.loc[df.index[1], 'base_clicks'] = 5
+    with engine.begin() as connection:
+        changed = filter_unchanged(connection, df)
+    assert changed['performance_id'].tolist() == [df['performance_id'].iloc[1]]
+
+
+def test_fingerprints_ignore_dtype_and_serialization_noise(engine):
+    df = performance_frame()
+    with engine.begin() as connection:
+        write_changed(connection, df, batch_size=100)
+
+    reread = df.copy()
+    reread['base_shows'] = reread['base_shows'].astype('float64')
+    reread['base_spent'] = reread['base_spent'] + 1e-10
+    with engine.begin() as connection:
+        assert filter_unchanged(connection, reread).empty
+
+
+def test_sync_window_keeps_settlement_lag():
+    today = date(2024, 1, 10)
+    assert sync_window(date(2024, 1, 9), today, 3) == (today - timedelta(days=3), today)
+    assert sync_window(date(2024, 1, 1), today, 3).start == date(2024, 1, 2)
+
+
+def test_filter_unchanged_of_empty_frame(engine):
+    df = performance_frame().iloc[:0]
+    with engine.begin() as connection:
+        assert filter_unchanged(connection, df).empty
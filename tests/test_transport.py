@@ -0,0 +1,88 @@
+import pytest
+import requests
+
+from src import transport as transport_module
+from src.ratelimit import TokenBucket
+from src.transport import Transport
+
+
+def response(status_code: int, headers=None) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result._content = b'{"items": []}'
+    return result
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(transport_module.time, 'sleep', delays.append)
+    return delays
+
+
+def stub(transport: Transport, monkeypatch, outcomes):
+    outcomes = iter(outcomes)
+
+    def get(*args, **kwargs):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(transport.session, 'get', get)
+
+
+def test_transport_retries_transient_failures(monkeypatch, sleeps):
+    with Transport(max_retries=3) as transport:
+        stub(transport, monkeypatch, [requests.ConnectionError(), response(503), response(200)])
+        assert transport.get_json('https://example.com/api/v2/banners.json') == {'items': []}
+
+    summary = transport.metrics.summary()['/api/v2/banners.json']
+    assert (summary['requests'], summary['retries']) == (3, 2)
+    assert len(sleeps) == 2
+
+
+def test_transport_honours_retry_after(monkeypatch, sleeps):
+    with Transport(max_retries=1) as transport:
+        stub(transport, monkeypatch, [response(503, {'Retry-After': '7'}), response(200)])
+        transport.request('https://example.com/api/v2/banners.json')
+    assert sleeps == [7.0]
+
+
+class RecordingBucket(TokenBucket):
+    def __init__(self) -> None:
+        super().__init__(rate=1000)
+        self.acquired = 0
+        self.pauses = []
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        self.acquired += 1
+
+    def pause(self, seconds: float) -> None:
+        self.pauses.append(seconds)
+
+
+def test_transport_pauses_rate_limiter_on_429(monkeypatch, sleeps):
+    bucket = RecordingBucket()
+    with Transport(max_retries=1, rate_limiter=bucket) as transport:
+        stub(transport, monkeypatch, [response(429, {'Retry-After': '5'}), response(200)])
+        transport.request('https://example.com/api/v2/banners.json')
+    assert bucket.pauses == [5.0]
+    assert bucket.acquired == 2
+    assert sleeps == [0]
+
+
+def test_transport_raises_after_max_retries(monkeypatch, sleeps):
+    with Transport(max_retries=2) as transport:
+        stub(transport, monkeypatch, [response(503)] * 3)
+        with pytest.raises(requests.HTTPError):
+            transport.request('https://example.com/api/v2/banners.json')
+    assert len(sleeps) == 2
+
+
+def test_transport_does_not_retry_client_errors(monkeypatch, sleeps):
+    with Transport(max_retries=2) as transport:
+        stub(transport, monkeypatch, [response(404)])
+        assert transport.request('https://example.com/api/v2/banners.json').status_code == 404
+    assert sleeps == []
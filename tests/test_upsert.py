@@ -0,0 +1,45 @@
+from sqlalchemy import select
+
+from src.models import Campaign
+from src.upsert import upsert, upsert_generic
+
+CAMPAIGNS = Campaign.__table__
+
+
+def stored(engine):
+    with engine.connect() as connection:
+        return dict(connection.execute(select(CAMPAIGNS.c.campaign_id, CAMPAIGNS.c.campaign_name)).all())
+
+
+def test_upsert_inserts_then_updates(engine):
+    with engine.begin() as connection:
+        result = upsert(connection, CAMPAIGNS, [{'campaign_id': 1, 'campaign_name': 'first'},
+                                                {'campaign_id': 2, 'campaign_name': 'second'}])
+    assert (result.inserted, result.updated) == (2, 0)
+
+    with engine.begin() as connection:
+        result = upsert(connection, CAMPAIGNS, [{'campaign_id': 2, 'campaign_name': 'renamed'},
+                                                {'campaign_id': 3, 'campaign_name': 'third'}], batch_size=1)
+    assert (result.inserted, result.updated) == (1, 1)
+    assert stored(engine) == {1: 'first', 2: 'renamed', 3: 'third'}
+
+
+def test_upsert_without_update_columns_keeps_existing_rows(engine):
+    with engine.begin() as connection:
+        upsert(connection, CAMPAIGNS, [{'campaign_id': 1, 'campaign_name': 'first'}])
+        result = upsert(connection, CAMPAIGNS, [{'campaign_id': 1}, {'campaign_id': 2}])
+    assert (result.inserted, result.updated) == (1, 1)
+    assert stored(engine) == {1: 'first', 2: None}
+
+
+def test_generic_upsert_round_trip(engine):
+    with engine.begin() as connection:
+        result = upsert_generic(connection, CAMPAIGNS, [{'campaign_id': 1, 'campaign_name': 'first'}])
+    assert (result.inserted, result.updated) == (1, 0)
+
+    with engine.begin() as connection:
+        result = upsert_generic(connection, CAMPAIGNS, [{'campaign_id': 1, 'campaign_name': 'stale'},
+                                                        {'campaign_id': 1, 'campaign_name': 'latest'},
+                                                        {'campaign_id': 2, 'campaign_name': 'second'}])
+    assert (result.inserted, result.updated) == (1, 1)
+    assert stored(engine) == {1: 'latest', 2: 'second'}